@@ -3,28 +3,97 @@ New Haven Hangouts - Flask Backend
 A location-based social app for checking in and meeting friends
 """
 
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, render_template, session, Response, stream_with_context, g, has_request_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from supabase import create_client, Client
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import os
+import json
+import hashlib
+import base64
 import uuid
-from flask_mail import Mail, Message
+import time
+import re
+import sqlite3
+import tempfile
+import unicodedata
+import urllib.parse
+import urllib.request
+import threading
+import queue
+import secrets
+import math
+import functools
+import gzip
+import concurrent.futures
+from collections import OrderedDict
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, messaging
+from flask.json.provider import DefaultJSONProvider
+import click
+# supabase, firebase_admin, flask_mail and certifi are imported on first use (see the
+# accessors below) so cold starts that never touch them - e.g. serving /about - stay fast.
+
+try:
+    import orjson
+except ImportError:  # optional: JSON falls back to the standard library encoder
+    orjson = None
+try:
+    import brotli
+except ImportError:  # optional: responses are compressed with gzip only
+    brotli = None
 
 # Load environment variables
 load_dotenv()
 
-# FIX: Force usage of certifi certificates to avoid [SSL: CERTIFICATE_VERIFY_FAILED]
-import certifi
-os.environ['SSL_CERT_FILE'] = certifi.where()
+# Guards the lazy initializers below (Supabase client, Firebase app, mail)
+_lazy_init_lock = threading.RLock()
+
+
+def use_certifi_bundle():
+    """FIX: Force usage of certifi certificates to avoid [SSL: CERTIFICATE_VERIFY_FAILED]"""
+    import certifi
+    os.environ['SSL_CERT_FILE'] = certifi.where()
+
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider, encoding with orjson when it is installed (several times faster on feed-sized payloads)
+    Output matches the default provider: dates still go through Flask's default(), and sort_keys / debug indentation are honored.
+    Calls with extra json.dumps keyword arguments keep using the standard library.
+    """
+
+    def _options(self, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent)) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 # Enable CORS for mobile app access (Origin must be specific if supports_credentials=True)
 # Enable CORS for mobile app access (Origin must be specific if supports_credentials=True)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:5000", "http://127.0.0.1:5000", "http://localhost:8000", "http://127.0.0.1:8000", "http://192.168.68.109:8000", "ionic://localhost", "capacitor://localhost", "http://localhost", "https://localhost", "http://127.0.0.1"]}}, supports_credentials=True)
@@ -46,72 +115,975 @@ app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
 app.config['MAIL_USE_TLS'] = True
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-mail = Mail(app)
+_mail = None
+
+
+def get_mail():
+    """The Flask-Mail extension, created on first use"""
+    global _mail
+    if _mail is None:
+        with _lazy_init_lock:
+            if _mail is None:
+                from flask_mail import Mail
+                _mail = Mail(app)
+    return _mail
 
 # Serializer for generating reset tokens
 serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'])
 
+# --- Metrics ---
+# Prometheus text-format metrics served at /metrics. Each thread writes to its own shard
+# (no lock on the hot path); a scrape merges the shards. Metrics are per process, so with
+# several gunicorn workers each worker reports its own numbers.
+
+class _Metric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _label_str(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def _merged(self):
+        """Sum of all shards; shards of finished threads are folded into a retired total"""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append(shard)
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = [(t, shard) for t, shard in self._shards if t.is_alive()]
+            merged = {}
+            self._merge(merged, self._retired)
+        for shard in live:
+            # dict.copy() is atomic under the GIL, so owners can keep writing while we read
+            self._merge(merged, shard.copy())
+        return merged
+
+
+class CounterMetric(_Metric):
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, target, shard):
+        for labels, value in shard.items():
+            target[labels] = target.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{self._label_str(labels)} {value}' for labels, value in sorted(self._merged().items())]
+        return lines
+
+
+class HistogramMetric(_Metric):
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # [count per bucket (non-cumulative, last = +Inf), sum, count]
+            entry = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def _merge(self, target, shard):
+        for labels, (counts, total, n) in shard.items():
+            m = target.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            m[0] = [a + b for a, b in zip(m[0], counts)]
+            m[1] += total
+            m[2] += n
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, n) in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_str(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_str(labels)} {total}')
+            lines.append(f'{self.name}_count{self._label_str(labels)} {n}')
+        return lines
+
+
+METRICS = []
+
+http_requests_total = CounterMetric(
+    'hangouts_http_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status'))
+http_request_duration = HistogramMetric(
+    'hangouts_http_request_duration_seconds', 'HTTP request latency', ('endpoint', 'method', 'status'))
+db_call_duration = HistogramMetric(
+    'hangouts_db_call_duration_seconds', 'Supabase call latency by table/function and operation',
+    ('target', 'operation'), buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+db_call_errors_total = CounterMetric(
+    'hangouts_db_call_errors_total', 'Supabase calls that raised', ('target', 'operation'))
+fcm_messages_total = CounterMetric(
+    'hangouts_fcm_messages_total', 'FCM push messages by outcome (sent, failed, retried)', ('outcome',))
+mail_messages_total = CounterMetric(
+    'hangouts_mail_messages_total', 'Outgoing emails by outcome (sent, failed, mocked)', ('kind', 'outcome'))
+rate_limited_total = CounterMetric(
+    'hangouts_rate_limited_total', 'Requests rejected with 429 by rule and bucket scope (user, ip)', ('rule', 'scope'))
+password_hash_duration = HistogramMetric(
+    'hangouts_password_hash_duration_seconds', 'Password hash/verify time including the wait for a pool slot',
+    ('operation',))
+checkin_fanout = HistogramMetric(
+    'hangouts_checkin_notification_fanout', 'Notifications created per check-in',
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    # Point-in-time gauges read from the components that already track them
+    push = push_dispatcher.stats()
+    lines += [
+        '# HELP hangouts_push_queue_depth Push messages waiting for a dispatcher worker',
+        '# TYPE hangouts_push_queue_depth gauge',
+        f'hangouts_push_queue_depth {push["queue_depth"]}',
+    ]
+    lines += render_pool_metrics()
+    return '\n'.join(lines) + '\n'
+
+
+# --- Database instrumentation ---
+# Every execute() on the Supabase client is recorded for the current request (table, operation,
+# duration, rows) and reported in a Server-Timing header; see add_db_timing below.
+
+DB_QUERY_BUDGET = int(os.getenv('DB_QUERY_BUDGET', 8))
+DB_DEBUG = os.getenv('DB_DEBUG', '').lower() in ('1', 'true', 'yes')
+QUERY_OPERATIONS = ('select', 'insert', 'update', 'upsert', 'delete')
+
+
+class InstrumentedQuery:
+    """Wraps a postgrest query builder so execute() is timed and recorded"""
+
+    def __init__(self, query, target, operation):
+        self._query = query
+        self._target = target
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if name == 'execute':
+            return self._execute
+        if not callable(attr):
+            # e.g. the .not_ property returns another builder
+            return InstrumentedQuery(attr, self._target, self._operation) if hasattr(attr, 'execute') else attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                operation = name if name in QUERY_OPERATIONS else self._operation
+                return InstrumentedQuery(result, self._target, operation)
+            return result
+        return call
+
+    def _execute(self):
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self._query.execute()
+            return response
+        finally:
+            record_db_call(self._target, self._operation, (time.perf_counter() - start) * 1000, response)
+
+
+class InstrumentedClient:
+    """
+    Wraps the Supabase client: table() and rpc() builders are instrumented, everything else passes through
+    Pass either a client or a zero-argument factory; the factory is only called on first use.
+    """
+
+    def __init__(self, client=None, factory=None):
+        self._client = client
+        self._factory = factory
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    def table(self, name):
+        return InstrumentedQuery(self.client.table(name), name, 'select')
+
+    def rpc(self, name, params=None):
+        return InstrumentedQuery(self.client.rpc(name, params or {}), name, 'rpc')
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+
+def record_db_call(target, operation, duration_ms, response):
+    """Record one database call in the metrics and the current request's log"""
+    db_call_duration.observe(duration_ms / 1000, target, operation)
+    if response is None:
+        db_call_errors_total.inc(target, operation)
+    if not has_request_context():
+        return
+    data = getattr(response, 'data', None)
+    rows = len(data) if isinstance(data, list) else int(data is not None)
+    if 'db_calls' not in g:
+        g.db_calls = []
+    g.db_calls.append({
+        'target': target,
+        'operation': operation,
+        'duration_ms': round(duration_ms, 2),
+        'rows': rows,
+        'ok': response is not None
+    })
+
+
+# --- HTTP connection pools ---
+# One keep-alive pool per upstream, shared by every request thread, so small PostgREST queries
+# and FCM sends reuse warm (already TLS-handshaked) connections instead of opening new ones.
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+HTTP_POOL_KEEPALIVE = int(os.getenv('HTTP_POOL_KEEPALIVE', HTTP_POOL_SIZE))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', 60))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+# How long a request waits for a free pooled connection before failing
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', 5))
+# 'auto' uses HTTP/2 when the h2 package is installed (one multiplexed connection per host)
+HTTP2 = os.getenv('HTTP2', 'auto').lower()
+FCM_POOL_SIZE = int(os.getenv('FCM_POOL_SIZE', 50))
+FCM_TIMEOUT = float(os.getenv('FCM_TIMEOUT', 10))
+
+# pool name -> callable returning {max, in_use, idle, opened, requests}; read by render_metrics
+HTTP_POOLS = {}
+IDEMPOTENT_HTTP_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+def http2_enabled():
+    if HTTP2 == 'auto':
+        import importlib.util
+        return importlib.util.find_spec('h2') is not None
+    return HTTP2 in ('1', 'true', 'yes', 'on')
+
+
+class InstrumentedTransport:
+    """Wraps an httpx transport to count requests and newly opened connections for the pool metrics"""
+
+    def __init__(self, transport, name, max_connections):
+        self._transport = transport
+        self.max_connections = max_connections
+        self.opened = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        HTTP_POOLS[name] = self.stats
+
+    def handle_request(self, request):
+        import httpx
+
+        def trace(event, info):
+            if event == 'connection.connect_tcp.complete':
+                with self._lock:
+                    self.opened += 1
+        request.extensions['trace'] = trace
+        with self._lock:
+            self.requests += 1
+        try:
+            return self._transport.handle_request(request)
+        except (httpx.RemoteProtocolError, httpx.ReadError):
+            # Usually a kept-alive connection the server had already closed. httpx's own retries
+            # only cover connect errors, so idempotent reads get one more try here (never writes,
+            # which may have reached the server)
+            if request.method not in IDEMPOTENT_HTTP_METHODS:
+                raise
+            return self._transport.handle_request(request)
+
+    def stats(self):
+        connections = list(self._transport._pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            'max': self.max_connections,
+            'in_use': len(connections) - idle,
+            'idle': idle,
+            'opened': self.opened,
+            'requests': self.requests,
+        }
+
+    def close(self):
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def build_http_transport(name, pool_size=None):
+    """Keep-alive httpx transport with the configured pool limits, registered under name in /metrics"""
+    import httpx
+    pool_size = pool_size or HTTP_POOL_SIZE
+    transport = httpx.HTTPTransport(
+        http2=http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=min(HTTP_POOL_KEEPALIVE, pool_size),
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        retries=1,  # retry a failed connect once; stale kept-alive connections: see handle_request
+    )
+    return InstrumentedTransport(transport, name, pool_size)
+
+
+def http_timeout():
+    import httpx
+    return httpx.Timeout(
+        connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT, write=HTTP_READ_TIMEOUT, pool=HTTP_POOL_TIMEOUT
+    )
+
+
+def build_fcm_adapter(name='fcm', pool_size=None):
+    """
+    requests adapter for the FCM session: send_each posts every message of a batch from its own
+    thread, so the pool blocks at pool_size instead of opening (and discarding) extra connections
+    """
+    import requests
+    from firebase_admin import _http_client
+    pool_size = pool_size or FCM_POOL_SIZE
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=_http_client.DEFAULT_RETRY_CONFIG
+    )
+
+    def stats():
+        pools = [adapter.poolmanager.pools[key] for key in adapter.poolmanager.pools.keys()]
+        idle = sum(1 for pool in pools for conn in list(pool.pool.queue) if conn is not None)
+        return {
+            'max': pool_size,
+            'in_use': sum(pool.pool.maxsize - pool.pool.qsize() for pool in pools),
+            'idle': idle,
+            'opened': sum(pool.num_connections for pool in pools),
+            'requests': sum(pool.num_requests for pool in pools),
+        }
+    HTTP_POOLS[name] = stats
+    return adapter
+
+
+def render_pool_metrics():
+    """Prometheus lines for every registered HTTP pool"""
+    pools = []
+    for pool, stats in sorted(HTTP_POOLS.items()):
+        try:
+            pools.append((pool, stats()))
+        except Exception as e:
+            print(f"Error reading HTTP pool stats for {pool}: {e}")
+    lines = [
+        '# HELP hangouts_http_pool_max_connections Connection limit of each HTTP pool',
+        '# TYPE hangouts_http_pool_max_connections gauge',
+    ]
+    lines += [f'hangouts_http_pool_max_connections{{pool="{pool}"}} {stats["max"]}' for pool, stats in pools]
+    lines += [
+        '# HELP hangouts_http_pool_connections Open pooled connections by state (in_use, idle)',
+        '# TYPE hangouts_http_pool_connections gauge',
+    ]
+    for pool, stats in pools:
+        lines.append(f'hangouts_http_pool_connections{{pool="{pool}",state="in_use"}} {stats["in_use"]}')
+        lines.append(f'hangouts_http_pool_connections{{pool="{pool}",state="idle"}} {stats["idle"]}')
+    lines += [
+        '# HELP hangouts_http_pool_connections_opened_total New connections (TCP/TLS handshakes) opened by each pool',
+        '# TYPE hangouts_http_pool_connections_opened_total counter',
+    ]
+    lines += [f'hangouts_http_pool_connections_opened_total{{pool="{pool}"}} {stats["opened"]}' for pool, stats in pools]
+    lines += [
+        '# HELP hangouts_http_pool_requests_total Requests sent through each pool',
+        '# TYPE hangouts_http_pool_requests_total counter',
+    ]
+    lines += [f'hangouts_http_pool_requests_total{{pool="{pool}"}} {stats["requests"]}' for pool, stats in pools]
+    return lines
+
+
 # Initialize Supabase client
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 # Use Service Role Key if available (for backend RLS bypass), otherwise fallback to Anon Key
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase_client = None
+
+
+def get_supabase():
+    """The raw Supabase client, created on first use (supabase-py and its httpx stack are slow to import)"""
+    global _supabase_client
+    if _supabase_client is None:
+        with _lazy_init_lock:
+            if _supabase_client is None:
+                use_certifi_bundle()
+                from supabase import create_client
+                from postgrest.utils import SyncClient
+                client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                # Swap postgrest's default httpx session for one on the shared keep-alive pool
+                postgrest = client.postgrest
+                default_session = postgrest.session
+                postgrest.session = SyncClient(
+                    base_url=default_session.base_url,
+                    headers=default_session.headers,
+                    timeout=http_timeout(),
+                    transport=build_http_transport('postgrest'),
+                    follow_redirects=True,
+                )
+                default_session.close()
+                _supabase_client = client
+    return _supabase_client
 
-# Initialize Firebase Admin SDK
-try:
-    # Check for environment variable first (for Vercel)
-    firebase_creds_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
-    
-    if firebase_creds_json:
-        # Parse JSON string from environment variable
-        import json
-        cred_dict = json.loads(firebase_creds_json)
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK initialized from environment variable")
-    else:
-        # Fallback to file (for local dev)
+
+supabase = InstrumentedClient(factory=get_supabase)
+
+# Firebase Admin SDK: initialized on the first push, None until then (False if unavailable)
+_firebase_ready = None
+
+
+def init_firebase():
+    """Initialize the Firebase Admin SDK; returns True if an app is ready to send"""
+    try:
+        # Check for environment variable first (for Vercel)
+        firebase_creds_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
         cred_path = os.getenv('FIREBASE_CREDENTIALS', 'serviceAccountKey.json')
-        if os.path.exists(cred_path):
+        if not firebase_creds_json and not os.path.exists(cred_path):
+            print(f"Warning: Firebase credentials not found. Set FIREBASE_SERVICE_ACCOUNT_JSON env var or place {cred_path} locally.")
+            return False
+
+        use_certifi_bundle()
+        import firebase_admin
+        from firebase_admin import credentials
+        if firebase_admin._apps:
+            return True
+
+        if firebase_creds_json:
+            # Parse JSON string from environment variable
+            cred_dict = json.loads(firebase_creds_json)
+            cred = credentials.Certificate(cred_dict)
+            firebase_admin.initialize_app(cred, {'httpTimeout': FCM_TIMEOUT})
+            print("Firebase Admin SDK initialized from environment variable")
+        else:
+            # Fallback to file (for local dev)
             cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred)
+            firebase_admin.initialize_app(cred, {'httpTimeout': FCM_TIMEOUT})
             print(f"Firebase Admin SDK initialized from file: {cred_path}")
-        else:
-            print(f"Warning: Firebase credentials not found. Set FIREBASE_SERVICE_ACCOUNT_JSON env var or place {cred_path} locally.")
-except Exception as e:
-    print(f"Error initializing Firebase: {e}")
+        pool_fcm_session()
+        return True
+    except Exception as e:
+        print(f"Error initializing Firebase: {e}")
+        return False
+
+
+def pool_fcm_session():
+    """Mount the pooled adapter on firebase_admin's messaging session (internal API - best effort)"""
+    try:
+        from firebase_admin import messaging
+        session = messaging._get_messaging_service(None)._client.session
+        session.mount('https://', build_fcm_adapter())
+    except Exception as e:
+        print(f"Warning: could not configure the FCM connection pool: {e}")
+
+
+def get_messaging():
+    """firebase_admin.messaging once Firebase is initialized (on first call), or None without credentials"""
+    global _firebase_ready
+    if _firebase_ready is None:
+        with _lazy_init_lock:
+            if _firebase_ready is None:
+                _firebase_ready = init_firebase()
+    if not _firebase_ready:
+        return None
+    from firebase_admin import messaging
+    return messaging
 
 
 # --- Helper Functions ---
 
-def send_push_notification(token, title, body, data=None):
-    try:
-        if not firebase_admin._apps:
-            return
-            
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
+def build_push_message(token, title, body, data=None):
+    """Build an FCM message for a single device token"""
+    from firebase_admin import messaging
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        # Ensure all values in the data dict are strings
+        data={k: str(v) for k, v in (data or {}).items()}, 
+        token=token,
+        android=messaging.AndroidConfig(
+            priority='high', # This is for delivery speed
+            notification=messaging.AndroidNotification(
+                channel_id='hangouts_alerts_v2',
+                default_sound=True,
+                default_vibrate_timings=True,
+                visibility='public'
             ),
-            # Ensure all values in the data dict are strings
-            data={k: str(v) for k, v in (data or {}).items()}, 
-            token=token,
-            android=messaging.AndroidConfig(
-                priority='high', # This is for delivery speed
-                notification=messaging.AndroidNotification(
-                    channel_id='hangouts_alerts_v2',
-                    default_sound=True,
-                    default_vibrate_timings=True,
-                    visibility='public'
-                ),
-            )
         )
-        response = messaging.send(message)
-        print('FCM success:', response)
+    )
+
+
+def is_retryable_fcm_error(error):
+    """FCM errors worth retrying; anything else (bad/unregistered token) is dropped. Non-FCM errors (network...) are retried"""
+    from firebase_admin import exceptions as firebase_exceptions, messaging
+    if not isinstance(error, firebase_exceptions.FirebaseError):
+        return True
+    return isinstance(error, (
+        messaging.QuotaExceededError,
+        firebase_exceptions.UnavailableError,
+        firebase_exceptions.InternalError,
+        firebase_exceptions.DeadlineExceededError,
+    ))
+
+
+class PushDispatcher:
+    """
+    Background FCM dispatcher
+    Messages are queued by the request thread and sent by worker threads in
+    send_each batches (FCM accepts up to 500 messages per batch), with retry and backoff.
+
+    backend: anything with a send_each(messages) method returning a BatchResponse.
+             Defaults to firebase_admin.messaging; tests can pass a fake.
+    workers: number of worker threads. 0 sends inline on the calling thread
+             (useful on serverless hosts that freeze the process after the response).
+    """
+
+    def __init__(self, backend=None, workers=2, batch_size=500, max_retries=3, backoff=0.5):
+        self.backend = backend
+        self.workers = workers
+        self.batch_size = min(batch_size, 500)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'batches': 0,
+            'latency_ms_total': 0.0,
+            'latency_ms_max': 0.0,
+        }
+
+    def _backend(self):
+        if self.backend is not None:
+            return self.backend
+        return get_messaging()
+
+    def enabled(self):
+        """Whether there is a backend to send through (initializes Firebase on first call)"""
+        return self._backend() is not None
+
+    def submit(self, messages):
+        """Queue messages for delivery and return immediately"""
+        if not messages or self._backend() is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats['enqueued'] += len(messages)
+
+        if self.workers <= 0:
+            for i in range(0, len(messages), self.batch_size):
+                self._send_batch([(m, now) for m in messages[i:i + self.batch_size]])
+            return
+
+        self._ensure_started()
+        for message in messages:
+            self._queue.put((message, now))
+
+    def flush(self, timeout=None):
+        """Block until every queued message has been processed (mainly for tests and shutdown)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        """Snapshot of queue depth, delivery counters and enqueue-to-send latency"""
+        with self._lock:
+            stats = dict(self._stats)
+        delivered = stats['sent'] + stats['failed']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['latency_ms_avg'] = stats['latency_ms_total'] / delivered if delivered else 0.0
+        return stats
+
+    def _ensure_started(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name='push-dispatcher', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is already waiting, up to one FCM batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                print(f"Push dispatcher error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send_batch(self, batch):
+        backend = self._backend()
+        pending = batch
+        attempt = 0
+        sent = failed = retried = 0
+
+        while pending:
+            try:
+                response = backend.send_each([m for m, _ in pending])
+                results = [(item, r.success, r.exception) for item, r in zip(pending, response.responses)]
+            except Exception as e:
+                # Whole batch failed (network, auth...) - retry all of it
+                results = [(item, False, e) for item in pending]
+
+            retry = []
+            for item, success, error in results:
+                if success:
+                    sent += 1
+                elif attempt < self.max_retries and is_retryable_fcm_error(error):
+                    retry.append(item)
+                else:
+                    failed += 1
+                    print('FCM error:', error)
+
+            if retry:
+                attempt += 1
+                retried += len(retry)
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            pending = retry
+
+        done = time.monotonic()
+        latency_ms = max((done - enqueued) * 1000 for _, enqueued in batch)
+        fcm_messages_total.inc('sent', amount=sent)
+        fcm_messages_total.inc('failed', amount=failed)
+        fcm_messages_total.inc('retried', amount=retried)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['sent'] += sent
+            self._stats['failed'] += failed
+            self._stats['retried'] += retried
+            self._stats['latency_ms_total'] += sum((done - enqueued) * 1000 for _, enqueued in batch)
+            self._stats['latency_ms_max'] = max(self._stats['latency_ms_max'], latency_ms)
+
+
+push_dispatcher = PushDispatcher(
+    # Vercel freezes the function once the response is sent, stranding queued pushes; send inline there
+    workers=int(os.getenv('PUSH_WORKERS', 0 if os.getenv('VERCEL') else 2)),
+    batch_size=int(os.getenv('PUSH_BATCH_SIZE', 500)),
+    max_retries=int(os.getenv('PUSH_MAX_RETRIES', 3)),
+    backoff=float(os.getenv('PUSH_RETRY_BACKOFF', 0.5))
+)
+
+
+def send_push_notification(token, title, body, data=None):
+    """Queue a single push notification for background delivery"""
+    try:
+        push_dispatcher.submit([build_push_message(token, title, body, data)])
     except Exception as e:
         print('FCM error:', e)
 
+
+class NotificationBroker:
+    """
+    In-process wake-up for open SSE streams when a notification is inserted
+    Streams always read the rows themselves from the database (so notifications created by
+    other workers or instances reach them too, on the next poll); this only lets a stream in
+    the same process deliver immediately. publish never blocks, and a full queue just drops
+    the wake-up.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+notification_broker = NotificationBroker(
+    max_queue=int(os.getenv('NOTIFICATION_STREAM_QUEUE', 100))
+)
+
+# Seconds between SSE heartbeats, between database polls for new rows, and how long one stream
+# stays open before the client is asked to reconnect (keeps worker threads and proxies from pinning forever)
+NOTIFICATION_STREAM_HEARTBEAT = int(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', 15))
+NOTIFICATION_STREAM_POLL = float(os.getenv('NOTIFICATION_STREAM_POLL', 5))
+NOTIFICATION_STREAM_MAX_SECONDS = int(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', 300))
+# A stream occupies a worker for its whole lifetime. 'auto' turns it off on Vercel (function time
+# limits) and on servers without request threads (gunicorn sync workers); clients then poll.
+# Set NOTIFICATION_STREAM=1 to force it on (e.g. gevent workers) or 0 to turn it off.
+NOTIFICATION_STREAM = os.getenv('NOTIFICATION_STREAM', 'auto')
+
+
+def notification_stream_enabled(environ):
+    if NOTIFICATION_STREAM != 'auto':
+        return NOTIFICATION_STREAM == '1'
+    return not os.getenv('VERCEL') and bool(environ.get('wsgi.multithread'))
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a per-entry time-to-live
+    Used to keep rarely-changing rows (friend lists, users) out of the hot request path
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    """
+    Process-wide cache for values that are the same for every user (community aggregates)
+    - single-flight: concurrent misses for a key run compute() once; the others wait for its result
+    - stale-while-revalidate: for `stale` seconds past the TTL the old value is served
+      immediately while one background thread refreshes it
+    - hit/miss counters via stats()
+    """
+
+    def __init__(self, ttl=60, stale=300):
+        self.ttl = ttl
+        self.stale = stale
+        self._data = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() (at most once at a time) when needed"""
+        with self._lock:
+            entry = self._data.get(key)
+            now = time.monotonic()
+            if entry is not None:
+                value, computed_at = entry
+                age = now - computed_at
+                if age < self.ttl:
+                    self._stats['hits'] += 1
+                    return value
+                if age < self.ttl + self.stale:
+                    self._stats['stale_hits'] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = threading.Event()
+                        threading.Thread(
+                            target=self._refresh, args=(key, compute), name='shared-cache-refresh', daemon=True
+                        ).start()
+                    return value
+
+            self._stats['misses'] += 1
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait()
+            with self._lock:
+                entry = self._data.get(key)
+            if entry is not None:
+                return entry[0]
+            # The leader failed; compute for ourselves rather than fail every waiter
+            return compute()
+
+        try:
+            value = compute()
+            with self._lock:
+                self._data[key] = (value, time.monotonic())
+            return value
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _refresh(self, key, compute):
+        try:
+            value = compute()
+            with self._lock:
+                self._data[key] = (value, time.monotonic())
+                self._stats['refreshes'] += 1
+        except Exception as e:
+            # Keep serving the stale value until it ages out
+            print(f"Shared cache refresh error for {key}: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        return stats
+
+
+# Community-wide aggregates (top places, active check-in count), shared by every request
+community_cache = SharedCache(
+    ttl=int(os.getenv('COMMUNITY_CACHE_TTL', 60)),
+    stale=int(os.getenv('COMMUNITY_CACHE_STALE', 300))
+)
+
+
+def get_community_top_places(limit=1):
+    """Top places across all users from the place_counts rollup, via community_cache"""
+    def compute():
+        response = supabase.table('place_counts').select('location_name, count').order(
+            'count', desc=True
+        ).order('location_name').limit(limit).execute()
+        return [{'location_name': row['location_name'], 'count': row['count']} for row in response.data]
+
+    return community_cache.get_or_compute(('top_places', limit), compute)
+
+
+def get_active_checkin_count():
+    """Number of unexpired check-ins across the whole community, via community_cache"""
+    def compute():
+        response = supabase.table('checkins').select('id', count='exact', head=True).gt(
+            'expires_at', datetime.utcnow().isoformat()
+        ).execute()
+        return response.count or 0
+
+    return community_cache.get_or_compute('active_checkins', compute)
+
+
+# Friend graph cache: user_id -> list of accepted friends ({user_id, username, email})
+# Invalidated explicitly whenever a friendship changes (see invalidate_friends)
+friend_cache = TTLCache(
+    maxsize=int(os.getenv('FRIEND_CACHE_SIZE', 2048)),
+    ttl=int(os.getenv('FRIEND_CACHE_TTL', 300))
+)
+
+
+def get_accepted_friends(user_id):
+    """Get accepted friends for a user, served from the friend graph cache when possible"""
+    friends = friend_cache.get(user_id)
+    if friends is not None:
+        return friends
+
+    friends_response = supabase.table('friendships').select(
+        'friend_id, users!friendships_friend_id_fkey(id, username, email)'
+    ).eq('user_id', user_id).eq('status', 'accepted').execute()
+
+    friends = [
+        {
+            'user_id': friend['users']['id'],
+            'username': friend['users']['username'],
+            'email': friend['users']['email']
+        }
+        for friend in friends_response.data
+        if friend.get('users')
+    ]
+    friend_cache.set(user_id, friends)
+    return friends
+
+
+def invalidate_friends(*user_ids):
+    """Drop cached friend lists after a friendship write"""
+    friend_cache.invalidate(*user_ids)
+
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -126,26 +1098,141 @@ class User(UserMixin):
         self.email = email
 
 
+# User cache for the Flask-Login loader: user_id -> {id, username, email}
+# Evicted whenever the users row changes (password reset, FCM token, account deletion)
+user_cache = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 300))
+)
+
+
 @login_manager.user_loader
 def load_user(user_id):
     # Don't wrap in try/except to avoid silencing DB errors
     # If DB is down, we want 500, not to log the user out!
-    response = supabase.table('users').select('*').eq('id', user_id).execute()
-    if response.data and len(response.data) > 0:
+    user_data = user_cache.get(user_id)
+    if user_data is None:
+        # Only the columns User needs - never pull password_hash or fcm_token here
+        response = supabase.table('users').select('id, username, email').eq('id', user_id).execute()
+        if not response.data or len(response.data) == 0:
+            return None
         user_data = response.data[0]
-        return User(user_data['id'], user_data['username'], user_data['email'])
-    return None
+        user_cache.set(user_id, user_data)
+    return User(user_data['id'], user_data['username'], user_data['email'])
 
 
+# --- Password hashing ---
+
+class PasswordHasherBusy(Exception):
+    """Every hashing slot stayed taken for the whole timeout"""
+
+
+class PasswordHasher:
+    """
+    Werkzeug password hashing off the request threads
+    Hashes run in a bounded process pool: at most max_pending hashes are in flight (scrypt needs
+    ~32 MB each), and a login burst only competes with feed requests for `workers` CPUs instead
+    of one per request thread. Callers wait up to timeout for a slot, then get PasswordHasherBusy.
+
+    method:  werkzeug method string, i.e. the work factor - 'scrypt:32768:8:1', 'pbkdf2:sha256:600000'...
+             Hashes made with other parameters are upgraded on the next successful login.
+    workers: pool processes. 0 hashes inline on the calling thread (hosts without multiprocessing).
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_pending=None, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers, 1) * 4)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return bool(password_hash) and self._run('verify', check_password_hash, password_hash, password)
+
+    def verify_unknown(self, password):
+        """Spend the same time as a real verify when there is no such user, so response times don't reveal which emails exist"""
+        self._run('verify', check_password_hash, self.dummy_hash(), password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        """Whether password_hash was made with other parameters than the current method"""
+        return password_hash.split('$', 1)[0] != self.dummy_hash().split('$', 1)[0]
+
+    def dummy_hash(self):
+        # Made with the current method, so its prefix is also the canonical form of the method
+        if self._dummy_hash is None:
+            self._dummy_hash = generate_password_hash(secrets.token_urlsafe(16), self.method)
+        return self._dummy_hash
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        start = time.perf_counter()
+        slot_held = True
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return fn(*args)
+            try:
+                future = executor.submit(fn, *args)
+                # The slot now belongs to the job: it is freed when the hash finishes, not when this
+                # caller gives up waiting, so abandoned hashes still count against max_pending
+                future.add_done_callback(lambda _: self._slots.release())
+                slot_held = False
+                return future.result(timeout=self.timeout)
+            except concurrent.futures.TimeoutError:
+                raise PasswordHasherBusy()
+            except concurrent.futures.process.BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool next time, hash this one inline
+                print("Password hash pool broke; restarting it")
+                with self._lock:
+                    self._executor = None
+                return fn(*args)
+        finally:
+            if slot_held:
+                self._slots.release()
+            password_hash_duration.observe(time.perf_counter() - start, operation)
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                try:
+                    # spawn: forking a process that already runs request threads isn't safe
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+                except (OSError, NotImplementedError) as e:
+                    print(f"Password hash pool unavailable, hashing inline: {e}")
+                    self.workers = 0
+            return self._executor
+
+
+password_hasher = PasswordHasher(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    # Serverless functions can't rely on multiprocessing; hash inline there
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', 0 if os.getenv('VERCEL') else min(4, os.cpu_count() or 1))),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0)) or None,
+    timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+)
+
 
 # Helper function for creating notifications
 def create_notifications(recipient_ids, sender_id, type, title, body, related_id=None):
     """
     Create notifications for one or multiple users
     recipient_ids: list of user_ids
+    Returns the number of notifications created
     """
     if not recipient_ids:
-        return
+        return 0
         
     notifications = []
     for uid in recipient_ids:
@@ -168,26 +1255,964 @@ def create_notifications(recipient_ids, sender_id, type, title, body, related_id
             data = supabase.table('notifications').insert(notifications).execute()
             print("Notifications sent successfully:", data)
             
-            # Send Push Notifications
+            # Wake any open notification streams in this process (they read the rows themselves)
             try:
+                for row in data.data or []:
+                    notification_broker.publish(row['user_id'], row['id'])
+            except Exception as stream_error:
+                print(f"Error publishing to notification stream: {stream_error}")
+            
+            # Send Push Notifications (queued - delivered in the background by push_dispatcher)
+            try:
+                if not push_dispatcher.enabled():
+                    return len(notifications)
                 # Fetch recipient tokens
-                users = supabase.table('users').select('id, fcm_token').in_('id', recipient_ids).execute()
+                users = supabase.table('users').select('id, fcm_token').in_(
+                    'id', [n['user_id'] for n in notifications]
+                ).execute()
+                notif_by_user = {n['user_id']: n for n in notifications}
+                messages = []
                 for user in users.data:
-                    if user.get('fcm_token'):
-                        # Find the matching notification to get body/title
-                        notif = next((n for n in notifications if n['user_id'] == user['id']), None)
-                        if notif:
-                            send_push_notification(
-                                user['fcm_token'], 
-                                notif['title'], 
-                                notif['body'],
-                                {'type': notif['type'], 'related_id': notif.get('related_id', '')}
-                            )
+                    notif = notif_by_user.get(user['id'])
+                    if user.get('fcm_token') and notif:
+                        messages.append(build_push_message(
+                            user['fcm_token'],
+                            notif['title'],
+                            notif['body'],
+                            {'type': notif['type'], 'related_id': notif.get('related_id', '')}
+                        ))
+                push_dispatcher.submit(messages)
             except Exception as push_error:
                 print(f"Error sending push: {push_error}")
                 
+            return len(notifications)
+                
         except Exception as e:
             print(f"Error sending notifications: {e}")
+    return 0
+
+
+def format_notification(row, sender_map):
+    """Shape a notifications row for the client (sender_map: sender_id -> username)"""
+    return {
+        'id': row['id'],
+        'type': row['type'],
+        'title': row['title'],
+        'body': row['body'],
+        'is_read': row.get('is_read', False),
+        'created_at': row['created_at'],
+        'sender_username': sender_map.get(row.get('sender_id'), 'System'),
+        'related_id': row.get('related_id')
+    }
+
+
+# Notification columns the client renders, with the sender's username embedded via the FK join
+NOTIFICATION_COLUMNS = (
+    'id, type, title, body, is_read, created_at, related_id, sender_id, '
+    'sender:users!notifications_sender_id_fkey(username)'
+)
+
+
+def notification_sender_map(rows):
+    """sender_id -> username for rows selected with NOTIFICATION_COLUMNS"""
+    return {row['sender_id']: row['sender']['username'] for row in rows if row.get('sender')}
+
+
+def encode_notification_cursor(row):
+    """Opaque keyset cursor for the (created_at, id) position of a notification"""
+    return base64.urlsafe_b64encode(f"{row['created_at']}|{row['id']}".encode()).decode()
+
+
+def decode_notification_cursor(cursor):
+    """Inverse of encode_notification_cursor; raises ValueError on a malformed cursor"""
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        datetime.fromisoformat(created_at.rstrip('Z'))
+        uuid.UUID(notification_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    return created_at, notification_id
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one Server-Sent Events frame"""
+    frame = ''
+    if event_id:
+        frame += f'id: {event_id}\n'
+    frame += f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    return frame
+
+
+def format_feed_checkin(row):
+    """
+    Shape a row returned by the get_feed RPC for the client
+    Ensures timestamps have a Z suffix for proper timezone handling
+    """
+    expires_at = row['expires_at']
+    if not expires_at.endswith('Z'):
+        expires_at = expires_at + 'Z'
+
+    created_at = row['created_at']
+    if not created_at.endswith('Z'):
+        created_at = created_at + 'Z'
+
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'username': row.get('username') or 'Unknown',
+        'location_name': row['location_name'],
+        'message': row['message'],
+        'lat': row['lat'],
+        'lng': row['lng'],
+        'expires_at': expires_at,
+        'created_at': created_at,
+        'attendees': row.get('attendees') or [],
+        'visibility': row.get('visibility') or 'everyone'
+    }
+
+
+# Feed sync snapshots: (viewer_id, cursor) -> {checkin_id: row version}
+# Lets /api/feed?since=<cursor> answer with only what changed since that cursor was issued.
+# A miss (expired, or served by another instance) just falls back to a full feed.
+feed_snapshot_cache = TTLCache(
+    maxsize=int(os.getenv('FEED_SNAPSHOT_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('FEED_SNAPSHOT_CACHE_TTL', 900))
+)
+
+FEED_VERSION_COLUMNS = ('user_id', 'username', 'location_name', 'message', 'lat', 'lng',
+                        'expires_at', 'created_at', 'visibility')
+
+
+def feed_row_version(row):
+    """Version key of a raw get_feed row: changes with any rendered column or the attendee set"""
+    # Attendee order from the RPC is not guaranteed
+    attendees = sorted(f"{a.get('user_id')}:{a.get('username')}" for a in row.get('attendees') or ())
+    return '|'.join([str(row.get(column)) for column in FEED_VERSION_COLUMNS] + attendees)
+
+
+def feed_cursor(versions):
+    """Sync cursor for a feed: changes whenever a check-in is added, edited, gains/loses attendees or expires"""
+    state = '\n'.join(f'{checkin_id}:{version}' for checkin_id, version in sorted(versions.items()))
+    return hashlib.sha1(state.encode()).hexdigest()[:20]
+
+
+# Fields a feed client may ask for with ?fields= ('id' is always sent, deltas are keyed on it)
+FEED_FIELDS = ('id', 'user_id', 'username', 'location_name', 'message', 'lat', 'lng',
+               'expires_at', 'created_at', 'attendees', 'visibility')
+
+
+def parse_feed_fields(value):
+    """
+    Parse ?fields=location_name,lat,lng into a tuple of feed fields (None = all fields)
+    Raises ValueError naming any unknown field
+    """
+    if not value:
+        return None
+    requested = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = sorted(set(requested) - set(FEED_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(f for f in FEED_FIELDS if f == 'id' or f in requested)
+
+
+def compact_feed(checkins):
+    """
+    Compact feed encoding: each distinct user is sent once in a side table and referenced by index
+    Returns (users, checkins) where users is [[user_id, username], ...], a check-in's user_id/username
+    become "user": index and attendees become a list of indexes.
+    """
+    users = []
+    index = {}
+
+    def intern(user_id, username):
+        key = (user_id, username)
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(users)
+            users.append([user_id, username])
+        return i
+
+    rows = []
+    for checkin in checkins:
+        row = dict(checkin)
+        if 'user_id' in row or 'username' in row:
+            row['user'] = intern(row.pop('user_id', None), row.pop('username', None))
+        if 'attendees' in row:
+            row['attendees'] = [intern(a.get('user_id'), a.get('username')) for a in row['attendees']]
+        rows.append(row)
+    return users, rows
+
+
+# --- Places: local autocomplete index and upstream geocoder cache ---
+
+def normalize_place_name(name):
+    """Lowercase, strip accents and punctuation so 'Café Nine' and 'cafe nine' index the same"""
+    name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name.lower()).split())
+
+
+def place_trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PlaceIndex:
+    """
+    In-memory autocomplete index over known places
+    Every word of a place name is indexed by its prefixes (fast path for typing),
+    with a trigram fallback for typos. Entries: {name, address, lat, lng, source, weight}
+    """
+
+    MAX_PREFIX = 12
+
+    def __init__(self, places=()):
+        self._places = {}
+        self._prefixes = {}
+        self._trigrams = {}
+        for place in places:
+            self.add(place)
+
+    def __len__(self):
+        return len(self._places)
+
+    def add(self, place):
+        key = normalize_place_name(place['name'])
+        if not key:
+            return
+        existing = self._places.get(key)
+        if existing is not None:
+            # Same venue from several sources: keep the richer record, add up popularity
+            existing['weight'] += place.get('weight', 1)
+            if not existing.get('address') and place.get('address'):
+                existing['address'] = place['address']
+            return
+
+        self._places[key] = dict(place, weight=place.get('weight', 1))
+        for word in key.split():
+            for i in range(1, min(len(word), self.MAX_PREFIX) + 1):
+                self._prefixes.setdefault(word[:i], set()).add(key)
+        for gram in place_trigrams(key):
+            self._trigrams.setdefault(gram, set()).add(key)
+
+    def search(self, query, limit=5):
+        query = normalize_place_name(query)
+        if not query:
+            return []
+
+        words = query.split()
+        keys = None
+        for word in words:
+            matches = self._prefixes.get(word[:self.MAX_PREFIX], set())
+            keys = matches if keys is None else keys & matches
+        # Words longer than MAX_PREFIX were only matched on their first MAX_PREFIX letters
+        long_words = [word for word in words if len(word) > self.MAX_PREFIX]
+        scored = [
+            (key.startswith(query), self._places[key]['weight'], 1.0, key)
+            for key in keys
+            if all(any(kw.startswith(word) for kw in key.split()) for word in long_words)
+        ]
+
+        if len(scored) < limit and len(query) >= 3:
+            # Typo-tolerant fallback: trigram similarity against the whole index
+            grams = place_trigrams(query)
+            shared = {}
+            for gram in grams:
+                for key in self._trigrams.get(gram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            seen = {key for _, _, _, key in scored}
+            for key, count in shared.items():
+                similarity = count / (len(grams) + len(place_trigrams(key)) - count)
+                if key not in seen and similarity >= 0.3:
+                    scored.append((False, self._places[key]['weight'], similarity, key))
+
+        scored.sort(key=lambda s: (not s[0], -s[2], -s[1], s[3]))
+        return [self._places[key] for _, _, _, key in scored[:limit]]
+
+
+class DiskLRUCache:
+    """
+    Small persistent LRU cache (sqlite) for upstream geocoder answers
+    Survives restarts on hosts with a disk; falls back to an in-memory database when the
+    path is not writable. Values must be JSON-serialisable.
+    """
+
+    def __init__(self, path, maxsize=10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._init_schema()
+        except sqlite3.Error as e:
+            print(f"Cache at {path} unavailable ({e}), using memory")
+            self._db = sqlite3.connect(':memory:', check_same_thread=False)
+            self._init_schema()
+
+    def _init_schema(self):
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS cache_used ON cache(used)')
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE cache SET used = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO cache (key, value, used) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
+            )
+            (size,) = self._db.execute('SELECT COUNT(*) FROM cache').fetchone()
+            if size > self.maxsize:
+                self._db.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used LIMIT ?)',
+                    (size - self.maxsize,)
+                )
+            self._db.commit()
+
+
+class GeocoderThrottled(Exception):
+    """The upstream geocoder's request budget is used up for now"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Geocoder busy, retry in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class NominatimGeocoder:
+    """
+    Upstream geocoder (OpenStreetMap Nominatim), only consulted on local/cache misses
+    Anything with the same search(query, limit) method can replace it, e.g. a stub in tests.
+    Calls are spaced min_interval seconds apart across the whole process (Nominatim's usage
+    policy allows 1 request/s). A caller waits for its slot for up to max_wait seconds,
+    otherwise GeocoderThrottled is raised.
+    """
+
+    def __init__(self, base_url='https://nominatim.openstreetmap.org', viewbox='-73.8,42.1,-71.7,40.9', timeout=3,
+                 min_interval=1.0, max_wait=1.0):
+        self.base_url = base_url.rstrip('/')
+        self.viewbox = viewbox
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self._next_slot = 0.0
+        self._throttle_lock = threading.Lock()
+
+    def _wait_for_slot(self):
+        with self._throttle_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if slot - now > self.max_wait:
+                raise GeocoderThrottled(slot - now)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _get(self, path, params):
+        self._wait_for_slot()
+        url = f'{self.base_url}/{path}?{urllib.parse.urlencode(params)}'
+        req = urllib.request.Request(url, headers={'User-Agent': 'NewHavenHangouts/1.0'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return json.loads(response.read().decode())
+
+    def search(self, query, limit=5):
+        items = self._get('search', {
+            'q': query,
+            'format': 'json',
+            'addressdetails': 1,
+            'limit': limit,
+            'countrycodes': 'us',
+            'viewbox': self.viewbox,
+            'bounded': 1
+        })
+        results = []
+        for item in items:
+            address = item.get('address') or {}
+            name = (item.get('name') or address.get('amenity') or address.get('shop')
+                    or address.get('building') or item['display_name'].split(',')[0])
+            results.append({
+                'name': name,
+                'address': item['display_name'],
+                'lat': float(item['lat']),
+                'lng': float(item['lon']),
+                'source': 'osm'
+            })
+        return results
+
+    def reverse(self, lat, lng):
+        item = self._get('reverse', {'lat': lat, 'lon': lng, 'format': 'json'})
+        address = item.get('address') or {}
+        return {
+            'name': (address.get('shop') or address.get('amenity') or address.get('building')
+                     or address.get('road') or 'Current Location'),
+            'address': item.get('display_name'),
+            'lat': lat,
+            'lng': lng,
+            'source': 'osm'
+        }
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision):
+    """Standard geohash of a point (precision 7 is a ~150m cell, 8 is ~38x19m)"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        ch <<= 1
+        if value >= mid:
+            ch |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[ch])
+            bits, ch = 0, 0
+    return ''.join(chars)
+
+
+def geohash_center(geohash):
+    """Center point (lat, lng) of a geohash cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        ch = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (ch >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+# Optional OSM extract for New Haven, produced by `flask import-places <file.geojson>`
+PLACES_EXTRACT_PATH = os.getenv('PLACES_EXTRACT_PATH', os.path.join(os.path.dirname(__file__), 'database', 'places_new_haven.json'))
+
+place_index_cache = SharedCache(
+    ttl=int(os.getenv('PLACES_INDEX_TTL', 900)),
+    stale=int(os.getenv('PLACES_INDEX_STALE', 3600))
+)
+# A check-in venue enters the shared index only once this many different users have checked in there
+PLACES_CATALOG_MIN_USERS = int(os.getenv('PLACES_CATALOG_MIN_USERS', 3))
+# Each user's own venues (private ones included), searched only for that user
+user_places_cache = TTLCache(
+    maxsize=int(os.getenv('USER_PLACES_CACHE_SIZE', 2048)),
+    ttl=int(os.getenv('USER_PLACES_CACHE_TTL', 300))
+)
+geocoder_cache = DiskLRUCache(
+    os.getenv('GEOCODER_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'hangouts_geocoder_cache.sqlite3')),
+    maxsize=int(os.getenv('GEOCODER_CACHE_SIZE', 10000))
+)
+geocoder = NominatimGeocoder(
+    base_url=os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org'),
+    min_interval=float(os.getenv('NOMINATIM_MIN_INTERVAL', 1.0))
+)
+
+
+def load_places_extract(path=None):
+    """Places from the imported OSM extract (empty if it was never imported)"""
+    path = path or PLACES_EXTRACT_PATH
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def add_catalog_rows(index, rows):
+    for row in rows:
+        index.add({
+            'name': row['location_name'],
+            'address': None,
+            'lat': row['lat'],
+            'lng': row['lng'],
+            'source': 'checkins',
+            'weight': row['count']
+        })
+    return index
+
+
+def build_place_index():
+    """
+    Shared index: the OSM extract plus public venues (weighted by popularity)
+    Private ('specific') check-ins and venues fewer than PLACES_CATALOG_MIN_USERS people have
+    been to are left out - every signed-in user searches this index.
+    """
+    index = PlaceIndex(load_places_extract())
+    try:
+        # See database/migrations/migration_place_catalog_privacy.sql
+        catalog = supabase.rpc('get_place_catalog', {'min_users': PLACES_CATALOG_MIN_USERS}).execute()
+        add_catalog_rows(index, catalog.data)
+    except Exception as e:
+        print(f"Error loading place catalog: {e}")
+    return index
+
+
+def get_place_index():
+    return place_index_cache.get_or_compute('index', build_place_index)
+
+
+def get_user_place_index(user_id):
+    """Index of the venues user_id has checked in at themselves"""
+    index = user_places_cache.get(user_id)
+    if index is None:
+        rows = supabase.rpc('get_user_places', {'viewer_id': user_id}).execute().data
+        index = add_catalog_rows(PlaceIndex(), rows)
+        user_places_cache.set(user_id, index)
+    return index
+
+
+def search_places(query, limit=5, user_id=None):
+    """
+    The user's own venues first, then the shared index; the upstream geocoder (behind the
+    persistent cache) is only asked when there are no local hits at all, so typing a known venue
+    never waits on the network
+    """
+    results = get_user_place_index(user_id).search(query, limit) if user_id else []
+    seen = {normalize_place_name(r['name']) for r in results}
+    for place in get_place_index().search(query, limit):
+        if len(results) >= limit:
+            break
+        if normalize_place_name(place['name']) not in seen:
+            results.append(place)
+    normalized = normalize_place_name(query)
+    if results or len(normalized) < 3:
+        return results
+
+    cache_key = f'search:{normalized}:{limit}'
+    upstream = geocoder_cache.get(cache_key)
+    if upstream is None:
+        try:
+            upstream = geocoder.search(query, limit)
+        except Exception as e:
+            print(f"Geocoder search error: {e}")
+            return results
+        geocoder_cache.set(cache_key, upstream)
+    return upstream[:limit]
+
+
+# Reverse geocoding: answers are shared by every point in the same geohash cell
+REVERSE_GEOHASH_PRECISION = int(os.getenv('REVERSE_GEOHASH_PRECISION', 7))
+reverse_geocode_cache = TTLCache(
+    maxsize=int(os.getenv('REVERSE_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('REVERSE_CACHE_TTL', 86400))
+)
+
+
+def reverse_geocode(lat, lng, precision=None):
+    """Name the place at lat/lng: memory cache, then disk cache, then the upstream geocoder"""
+    cell = geohash_encode(lat, lng, precision or REVERSE_GEOHASH_PRECISION)
+
+    place = reverse_geocode_cache.get(cell)
+    if place is not None:
+        return place
+
+    cache_key = f'reverse:{cell}'
+    place = geocoder_cache.get(cache_key)
+    if place is None:
+        # Resolve the cell center so the cached answer doesn't depend on who asked first
+        center_lat, center_lng = geohash_center(cell)
+        place = dict(geocoder.reverse(center_lat, center_lng), geohash=cell)
+        geocoder_cache.set(cache_key, place)
+
+    reverse_geocode_cache.set(cell, place)
+    return place
+
+
+# Expired check-in sweeper (see database/migrations/migration_checkins_archive.sql)
+SWEEP_BATCH_SIZE = int(os.getenv('SWEEP_BATCH_SIZE', 500))
+SWEEP_MAX_BATCHES = int(os.getenv('SWEEP_MAX_BATCHES', 20))
+SWEEP_GRACE_MINUTES = int(os.getenv('SWEEP_GRACE_MINUTES', 60))
+
+
+def sweep_expired_checkins(batch_size=None, max_batches=None, grace_minutes=None):
+    """
+    Move expired check-ins (and their attendees) into checkins_archive, one bounded batch per
+    round trip so a large backlog never turns into one long lock-holding statement.
+    Returns the number of check-ins archived.
+    """
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    max_batches = max_batches or SWEEP_MAX_BATCHES
+    grace_minutes = SWEEP_GRACE_MINUTES if grace_minutes is None else grace_minutes
+
+    total = 0
+    for _ in range(max_batches):
+        response = supabase.rpc('archive_expired_checkins', {
+            'batch_size': batch_size,
+            'grace_minutes': grace_minutes
+        }).execute()
+        moved = response.data or 0
+        total += moved
+        if moved < batch_size:
+            break
+    return total
+
+
+@app.cli.command('sweep-checkins')
+@click.option('--batch-size', type=int, default=None, help='Check-ins archived per round trip')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches')
+def sweep_checkins_command(batch_size, max_batches):
+    """Archive expired check-ins"""
+    moved = sweep_expired_checkins(batch_size, max_batches)
+    click.echo(f"Archived {moved} expired check-ins")
+
+
+@app.cli.command('import-places')
+@click.argument('geojson_path')
+def import_places(geojson_path):
+    """Import an OSM GeoJSON extract (e.g. from Overpass) into the local place index"""
+    with open(geojson_path) as f:
+        features = json.load(f).get('features', [])
+
+    places = []
+    for feature in features:
+        props = feature.get('properties') or {}
+        geometry = feature.get('geometry') or {}
+        if not props.get('name') or geometry.get('type') != 'Point':
+            continue
+        lng, lat = geometry['coordinates'][:2]
+        street = ' '.join(filter(None, [props.get('addr:housenumber'), props.get('addr:street')]))
+        places.append({
+            'name': props['name'],
+            'address': street or None,
+            'lat': lat,
+            'lng': lng,
+            'source': 'osm'
+        })
+
+    with open(PLACES_EXTRACT_PATH, 'w') as f:
+        json.dump(places, f)
+    place_index_cache.invalidate('index')
+    click.echo(f"Imported {len(places)} places into {PLACES_EXTRACT_PATH}")
+
+
+# --- Rate limiting ---
+# Token buckets on the write and auth endpoints, per user and per client IP, so one client
+# retrying in a loop can't fan out inserts and pushes. A bucket holds up to `capacity` tokens
+# and refills at capacity/period per second; each request takes one. An empty bucket means 429
+# with Retry-After.
+
+class MemoryRateLimitBackend:
+    """
+    Buckets in this process: key -> [tokens, last update, seconds to refill completely], in LRU order
+    A bucket that has been idle long enough to be full again holds no information, so idle buckets
+    are evicted from the LRU end as requests come in (a couple per take - amortized O(1)); max_keys
+    caps memory under a flood of distinct keys.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        """Take cost tokens from key's bucket; returns (allowed, seconds until it would be allowed)"""
+        now = time.monotonic()
+        buckets = self._buckets
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [capacity, now, capacity / rate]
+            else:
+                buckets.move_to_end(key)
+                tokens = bucket[0] + (now - bucket[1]) * rate
+                bucket[0] = tokens if tokens < capacity else capacity
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                result = (True, 0.0)
+            else:
+                result = (False, (cost - bucket[0]) / rate)
+
+            for _ in range(2):
+                oldest_key = next(iter(buckets))
+                oldest = buckets[oldest_key]
+                if oldest is bucket or (now - oldest[1] < oldest[2] and len(buckets) <= self.max_keys):
+                    break
+                del buckets[oldest_key]
+        return result
+
+    def evict_idle(self):
+        """Drop every bucket that has refilled completely; returns how many were dropped"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, (_, updated, refill) in self._buckets.items() if now - updated >= refill]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SupabaseRateLimitBackend:
+    """
+    Buckets shared by every instance, in Postgres (see database/migrations/migration_rate_limits.sql)
+    Costs one RPC per bucket per request; use it when several instances must share one limit.
+    """
+
+    def __init__(self, idle_seconds=3600):
+        self.idle_seconds = idle_seconds
+
+    def take(self, key, capacity, rate, cost=1):
+        response = supabase.rpc('rate_limit_take', {
+            'p_key': key,
+            'p_capacity': capacity,
+            'p_rate': rate,
+            'p_cost': cost
+        }).execute()
+        row = response.data[0]
+        return row['allowed'], row['retry_after']
+
+    def evict_idle(self):
+        response = supabase.rpc('rate_limit_evict', {'idle_seconds': self.idle_seconds}).execute()
+        return response.data or 0
+
+
+class RateLimiter:
+    """
+    rules: rule name -> {scope: (capacity, tokens per second)}; scopes are 'user' and 'ip'
+    backend: anything with take(key, capacity, rate, cost) -> (allowed, retry_after) and evict_idle()
+    """
+
+    def __init__(self, backend, rules, enabled=True):
+        self.backend = backend
+        self.rules = rules
+        self.enabled = enabled
+        # rule -> [(scope, key prefix, capacity, rate)], so the per-request loop only concatenates
+        self._buckets = {
+            rule: [(scope, f'{rule}:{scope}:', capacity, rate) for scope, (capacity, rate) in scopes.items()]
+            for rule, scopes in rules.items()
+        }
+
+    def check(self, rule, subjects):
+        """Take a token from each of the rule's buckets; returns seconds to wait if any was empty, else None"""
+        if not self.enabled:
+            return None
+        retry_after = None
+        for scope, prefix, capacity, rate in self._buckets[rule]:
+            subject = subjects.get(scope)
+            if subject is None:
+                continue
+            try:
+                allowed, wait = self.backend.take(prefix + subject, capacity, rate)
+            except Exception as e:
+                # Fail open: a broken limiter must not take the endpoint down with it
+                print(f"Rate limit backend error ({rule}): {e}")
+                continue
+            if not allowed:
+                rate_limited_total.inc(rule, scope)
+                retry_after = max(retry_after or 0.0, wait)
+        return retry_after
+
+
+def parse_rate_limit(value):
+    """'capacity/seconds' (e.g. '5/300' = 5 requests per 5 minutes) -> (capacity, tokens per second)"""
+    capacity, seconds = value.split('/')
+    return float(capacity), float(capacity) / float(seconds)
+
+
+# Defaults, each overridable with RATE_LIMIT_<RULE>_<SCOPE> ('off' drops that bucket). IP limits
+# are generous on purpose: a whole campus network can share one address.
+RATE_LIMIT_DEFAULTS = {
+    'checkin': {'user': '5/300', 'ip': '60/300'},
+    'coming': {'user': '30/60', 'ip': '120/60'},
+    'friends_add': {'user': '30/60', 'ip': '120/60'},
+    'friends_add_bulk': {'user': '5/300', 'ip': '30/300'},
+    'login': {'user': '10/300', 'ip': '60/60'},
+    'reset_password': {'user': '3/3600', 'ip': '10/300'},
+    'places_reverse': {'user': '30/60', 'ip': '120/60'},
+}
+
+
+def load_rate_limit_rules():
+    rules = {}
+    for rule, scopes in RATE_LIMIT_DEFAULTS.items():
+        rules[rule] = {}
+        for scope, default in scopes.items():
+            value = os.getenv(f'RATE_LIMIT_{rule.upper()}_{scope.upper()}', default)
+            if value.lower() not in ('', 'off', 'none'):
+                rules[rule][scope] = parse_rate_limit(value)
+    return rules
+
+
+# Behind Vercel's proxy the client address is the first X-Forwarded-For hop; elsewhere that
+# header is client-controlled, so only trust it when told to
+RATE_LIMIT_TRUST_FORWARDED = os.getenv(
+    'RATE_LIMIT_TRUST_FORWARDED', '1' if os.getenv('VERCEL') else '0'
+).lower() in ('1', 'true', 'yes')
+
+rate_limiter = RateLimiter(
+    SupabaseRateLimitBackend() if os.getenv('RATE_LIMIT_BACKEND') == 'supabase'
+    else MemoryRateLimitBackend(max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))),
+    load_rate_limit_rules(),
+    enabled=os.getenv('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+)
+
+
+def client_ip(req):
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = req.headers.get('X-Forwarded-For')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return req.remote_addr or 'unknown'
+
+
+def rate_limit_subjects():
+    """Who the current request counts against: the logged-in user (else the user_id/email it names, per IP) and its IP"""
+    # Runs on every limited request, so skip the current_user proxy: Flask-Login keeps the
+    # logged-in id in the session (and @login_required has already loaded it where it matters)
+    req = request._get_current_object()
+    ip = client_ip(req)
+    user = session.get('_user_id')
+    if user is None:
+        # Anyone can put someone else's email in a login or reset body, so before authentication
+        # the per-user bucket is per (email, IP): a stranger can't lock the real owner out
+        data = req.get_json(silent=True) or {}
+        user = data.get('user_id') or data.get('email')
+        user = f"{str(user).strip().lower()}|{ip}" if user else None
+    return {'user': user, 'ip': ip}
+
+
+def rate_limited(rule):
+    """Route decorator: 429 with Retry-After once the rule's per-user or per-IP bucket is empty"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            retry_after = rate_limiter.check(rule, rate_limit_subjects())
+            if retry_after is not None:
+                response = jsonify({'error': 'Too many requests, please slow down'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Per-endpoint request count and latency (route pattern, not raw path, to bound cardinality)"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = str(response.status_code)
+        http_requests_total.inc(endpoint, request.method, status)
+        http_request_duration.observe(time.perf_counter() - start, endpoint, request.method, status)
+    return response
+
+
+# Response compression, negotiated from Accept-Encoding (brotli when installed, else gzip)
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', '1') == '1'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+COMPRESS_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+def negotiate_encoding(accept_encodings):
+    """Best encoding this server can produce that the client accepts, or None"""
+    for encoding in ('br', 'gzip') if brotli is not None else ('gzip',):
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+# Registered before add_db_timing so it runs after it (after_request hooks run in reverse order)
+# and compresses the final body, but still inside the request latency recorded above.
+@app.after_request
+def compress_response(response):
+    """
+    Compress text/JSON bodies of COMPRESS_MIN_BYTES or more
+    Streams (SSE), static files and responses that are already encoded are left alone.
+    A strong ETag becomes weak, since the bytes now depend on the encoding; If-None-Match still matches it.
+    """
+    if (not COMPRESS_RESPONSES or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+@app.after_request
+def add_db_timing(response):
+    """
+    Report this request's database calls
+    - Server-Timing: total db time; with DB_DEBUG=1 also the call count and one entry per call
+      (table/RPC names stay out of public responses)
+    - with DB_DEBUG=1 and ?_debug=db, the full call log is appended to JSON bodies as "_db"
+    - a warning is printed when a route makes more than DB_QUERY_BUDGET calls
+    """
+    calls = g.pop('db_calls', None)
+    if not calls:
+        return response
+
+    total_ms = sum(c['duration_ms'] for c in calls)
+    if DB_DEBUG:
+        timings = [f'db;dur={total_ms:.2f};desc="{len(calls)} queries"']
+        timings += [
+            f'db{i};dur={c["duration_ms"]:.2f};desc="{c["target"]} {c["operation"]} ({c["rows"]} rows)"'
+            for i, c in enumerate(calls[:20])
+        ]
+    else:
+        timings = [f'db;dur={total_ms:.2f}']
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+
+    if len(calls) > DB_QUERY_BUDGET:
+        breakdown = {}
+        for c in calls:
+            key = f'{c["target"]}.{c["operation"]}'
+            breakdown[key] = breakdown.get(key, 0) + 1
+        print(f"Warning: {request.method} {request.path} made {len(calls)} database calls "
+              f"(budget {DB_QUERY_BUDGET}, {total_ms:.1f}ms): {breakdown}")
+
+    if DB_DEBUG and request.args.get('_debug') == 'db' and response.is_json and not response.direct_passthrough:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body['_db'] = {'calls': calls, 'count': len(calls), 'total_ms': round(total_ms, 2)}
+            response.set_data(json.dumps(body))
+
+    return response
+
 
 # ==================== ROUTES ====================
 
@@ -244,7 +2269,7 @@ def signup():
             return jsonify({'error': 'Email already registered'}), 400
         
         # Hash password
-        password_hash = generate_password_hash(password)
+        password_hash = password_hasher.hash(password)
         
         # Create new user
         new_user = supabase.table('users').insert({
@@ -266,11 +2291,14 @@ def signup():
         else:
             return jsonify({'error': 'Failed to create user'}), 500
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login():
     """
     User login endpoint
@@ -289,14 +2317,24 @@ def login():
         response = supabase.table('users').select('*').eq('email', email).execute()
         
         if not response.data or len(response.data) == 0:
+            password_hasher.verify_unknown(password)
             return jsonify({'error': 'Invalid email or password'}), 401
         
         user_data = response.data[0]
         
         # Verify password
-        if not check_password_hash(user_data['password_hash'], password):
+        if not password_hasher.verify(user_data['password_hash'], password):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with an older work factor while we have the plaintext
+        if password_hasher.needs_rehash(user_data['password_hash']):
+            try:
+                supabase.table('users').update({
+                    'password_hash': password_hasher.hash(password)
+                }).eq('id', user_data['id']).execute()
+            except Exception as e:
+                print(f"Error rehashing password: {e}")
+        
         # Log in user
         remember = data.get('remember', False)
         user = User(user_data['id'], user_data['username'], user_data['email'])
@@ -308,11 +2346,14 @@ def login():
             'email': user_data['email']
         }), 200
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/auth/reset-password-request', methods=['POST'])
+@rate_limited('reset_password')
 def reset_password_request():
     """
     Request a password reset email
@@ -340,6 +2381,7 @@ def reset_password_request():
         reset_url = request.url_root.rstrip('/') + f'/reset-password/{token}'
         
         # Send Email
+        from flask_mail import Message
         msg = Message('Password Reset Request', 
                       sender=app.config.get('MAIL_USERNAME') or 'noreply@hangouts.com',
                       recipients=[email])
@@ -351,14 +2393,17 @@ If you did not make this request then simply ignore this email and no changes wi
 """
         try:
             if app.config.get('MAIL_USERNAME'):
-                mail.send(msg)
+                get_mail().send(msg)
+                mail_messages_total.inc('password_reset', 'sent')
             else:
                 print("\n" + "="*50)
                 print(f"MOCK EMAIL TO {email}:")
                 print(msg.body)
                 print("="*50 + "\n")
+                mail_messages_total.inc('password_reset', 'mocked')
         except Exception as e:
             print(f"Error sending email: {e}")
+            mail_messages_total.inc('password_reset', 'failed')
             # Still return success to user
         
         return jsonify({'message': 'If your email is registered, you will receive a reset link.'}), 200
@@ -398,12 +2443,13 @@ def reset_password_perform(token):
             return jsonify({'error': 'Password required'}), 400
             
         # Hash new password
-        password_hash = generate_password_hash(new_password)
+        password_hash = password_hasher.hash(new_password)
         
         # Update user
-        supabase.table('users').update({
+        updated = supabase.table('users').update({
             'password_hash': password_hash
         }).eq('email', email).execute()
+        user_cache.invalidate(*[u['id'] for u in (updated.data or [])])
         
         return jsonify({'success': True, 'message': 'Password has been reset successfully.'}), 200
         
@@ -411,6 +2457,8 @@ def reset_password_perform(token):
         return jsonify({'error': 'Token expired'}), 400
     except BadTimeSignature:
         return jsonify({'error': 'Invalid token'}), 400
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -430,11 +2478,16 @@ def delete_account():
     try:
         user_id = current_user.id
         
+        # Remember who had this user cached as a friend before the cascade removes the rows
+        friend_ids = [f['user_id'] for f in get_accepted_friends(user_id)]
+        
         # Logout first to clear session
         logout_user()
         
         # Delete user from Supabase (friendships, checkins, attendees will be deleted via ON DELETE CASCADE)
         supabase.table('users').delete().eq('id', user_id).execute()
+        invalidate_friends(user_id, *friend_ids)
+        user_cache.invalidate(user_id)
         
         return jsonify({'success': True, 'message': 'Account deleted successfully'}), 200
         
@@ -464,49 +2517,36 @@ def get_user_stats():
     Returns: {
         "total_checkins": 15,
         "favorite_places": [{"location_name": "Koffee", "count": 5}, ...],
-        "community_top_place": {"location_name": "The Stack", "count": 42}
+        "community_top_place": {"location_name": "The Stack", "count": 42},
+        "community_active_checkins": 7
     }
     """
     try:
+        # Counts come from rollup tables kept exact by a trigger on checkins
+        # See database/migrations/migration_stats_rollups.sql
+
         # 1. Total Check-ins for current user
-        total_response = supabase.table('checkins').select('*', count='exact').eq('user_id', current_user.id).execute()
-        total_checkins = total_response.count if total_response.count is not None else len(total_response.data)
-        
-        # 2. Favorite Places for current user (Client-side aggregation required if no advanced SQL view)
-        # Note: Supabase JS/store procedures are ideal, but for now we fetch user's checkins and aggregate in Python
-        # Fetch only location names for efficiency
-        # Using a limit of 1000 for now, ideally we'd paginate or use a specialized query
-        user_checkins_response = supabase.table('checkins').select('location_name').eq('user_id', current_user.id).limit(1000).execute()
-        
-        from collections import Counter
-        user_locations = [c['location_name'] for c in user_checkins_response.data]
-        user_location_counts = Counter(user_locations)
+        total_response = supabase.table('user_checkin_totals').select('total').eq('user_id', current_user.id).execute()
+        total_checkins = total_response.data[0]['total'] if total_response.data else 0
+        
+        # 2. Favorite Places for current user
+        favorites_response = supabase.table('user_place_counts').select('location_name, count').eq(
+            'user_id', current_user.id
+        ).order('count', desc=True).order('location_name').limit(3).execute()
         favorite_places = [
-            {'location_name': loc, 'count': count}
-            for loc, count in user_location_counts.most_common(3)
+            {'location_name': row['location_name'], 'count': row['count']}
+            for row in favorites_response.data
         ]
         
-        # 3. Community Top Place
-        # Fetch all checkins (limited) or create a DB view. For MVP, we'll fetch a batch.
-        # Ideally: Create a Postgres VIEW for this. 
-        # Fallback: Fetch last N global checkins and aggregate, or reliance on a future View.
-        # Let's try to fetch checkins and aggregate in Python for now (MVP scale).
-        all_checkins_response = supabase.table('checkins').select('location_name').limit(2000).execute()
-        all_locations = [c['location_name'] for c in all_checkins_response.data]
-        all_location_counts = Counter(all_locations)
-        top_place_data = all_location_counts.most_common(1)
-        
-        community_top_place = None
-        if top_place_data:
-            community_top_place = {
-                'location_name': top_place_data[0][0],
-                'count': top_place_data[0][1]
-            }
+        # 3. Community aggregates - identical for everyone, served from community_cache
+        top_places = get_community_top_places(1)
+        community_top_place = top_places[0] if top_places else None
             
         return jsonify({
             'total_checkins': total_checkins,
             'favorite_places': favorite_places,
-            'community_top_place': community_top_place
+            'community_top_place': community_top_place,
+            'community_active_checkins': get_active_checkin_count()
         }), 200
         
     except Exception as e:
@@ -515,6 +2555,7 @@ def get_user_stats():
 
 
 @app.route('/api/checkin', methods=['POST'])
+@rate_limited('checkin')
 def checkin():
     """
     Create a new check-in
@@ -573,6 +2614,7 @@ def checkin():
         if response.data:
             checkin_data = response.data[0]
             checkin_id = checkin_data['id']
+            user_places_cache.invalidate(user_id)
             
             # --- SEND NOTIFICATIONS ---
             try:
@@ -582,10 +2624,7 @@ def checkin():
                     recipients = share_with
                 else:
                     # Get all confirmed friends
-                    friends_response = supabase.table('friendships').select('friend_id').eq(
-                        'user_id', user_id
-                    ).eq('status', 'accepted').execute()
-                    recipients = [f['friend_id'] for f in friends_response.data]
+                    recipients = [f['user_id'] for f in get_accepted_friends(user_id)]
 
                 # Format duration string
                 hours = duration_minutes // 60
@@ -601,7 +2640,7 @@ def checkin():
                 # Create notifications
                 pusher_name = current_user.username if current_user.is_authenticated else "Someone"
                 
-                create_notifications(
+                fanout = create_notifications(
                     recipients, 
                     user_id, 
                     'checkin_alert', 
@@ -609,6 +2648,7 @@ def checkin():
                     f"{pusher_name} has checked into {location_name} for {duration_str}! Are you coming?",
                     checkin_id
                 )
+                checkin_fanout.observe(fanout)
             except Exception as e:
                 print(f"Notification error: {e}")
 
@@ -627,111 +2667,280 @@ def checkin():
 def feed():
     """
     Get active check-ins from friends
-    Query params: user_id
-    Returns: Array of check-ins with user info
+    Query params: user_id, since (optional cursor from a previous response),
+                  fields (optional, e.g. fields=location_name,lat,lng - 'id' is always included),
+                  format=compact (optional: users sent once in "users", referenced by index)
+    Returns: { "checkins": [...], "cursor": "..." }
+             With since: { "checkins": [new/updated only], "removed": [ids], "cursor": "...", "delta": true }
+             With format=compact: also "users": [[user_id, username], ...]; check-ins carry "user": index
+             and "attendees": [index, ...] instead of user_id/username and attendee objects
+    Responses carry an ETag; If-None-Match gets a 304 when nothing changed.
     """
     try:
         user_id = request.args.get('user_id')
+        since = request.args.get('since')
+        wire_format = request.args.get('format', 'full')
         
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
+
+        try:
+            fields = parse_feed_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if wire_format not in ('full', 'compact'):
+            return jsonify({'error': 'format must be full or compact'}), 400
+        
+        # Friend join, expiry filter and visibility (share_with) check all run in Postgres.
+        # See database/migrations/migration_feed_rpc.sql
+        feed_response = supabase.rpc('get_feed', {'viewer_id': user_id}).execute()
+
+        # The cursor (and so the ETag) comes from the raw rows, so an unchanged feed is answered
+        # with a 304 before anything is formatted or encoded
+        versions = {row['id']: feed_row_version(row) for row in feed_response.data}
+        cursor = feed_cursor(versions)
+        feed_snapshot_cache.set((user_id, cursor), versions)
+        previous = feed_snapshot_cache.get((user_id, since)) if since else None
+
+        etag = f'{since}-{cursor}' if previous is not None else cursor
+        if fields or wire_format != 'full':
+            variant = f"{','.join(fields or ())}|{wire_format}"
+            etag = f'{etag}-{hashlib.sha1(variant.encode()).hexdigest()[:8]}'
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            # Echo the validator as sent: compressed 200s carry it weak (see compress_response)
+            response.set_etag(etag, weak=not request.if_none_match.contains(etag))
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        if previous is not None:
+            # Delta sync: only check-ins that are new or changed (incl. attendees), plus ids that
+            # expired, were deleted or are no longer shared with this viewer
+            payload = {
+                'checkins': [format_feed_checkin(row) for row in feed_response.data
+                             if previous.get(row['id']) != versions[row['id']]],
+                'removed': [checkin_id for checkin_id in previous if checkin_id not in versions],
+                'cursor': cursor,
+                'delta': True
+            }
+        else:
+            payload = {'checkins': [format_feed_checkin(row) for row in feed_response.data], 'cursor': cursor}
+
+        # Versions and cursor above always cover every field, so a cursor stays valid across fieldsets
+        if fields:
+            payload['checkins'] = [{f: c[f] for f in fields} for c in payload['checkins']]
+        if wire_format == 'compact':
+            payload['users'], payload['checkins'] = compact_feed(payload['checkins'])
+
+        response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
         
-        # Get list of friends (accepted friendships)
-        friends_response = supabase.table('friendships').select('friend_id').eq(
-            'user_id', user_id
-        ).eq('status', 'accepted').execute()
-        
-        friend_ids = [f['friend_id'] for f in friends_response.data]
-        
-        # Also include the user's own check-ins
-        friend_ids.append(user_id)
-        
-        # Get active check-ins from friends
-         # FILTERING LOGIC:
-        # We fetch all active check-ins from friends, then filter in Python for visibility.
-        # This is not most efficient for scale, but flexible for complex rules.
-
-        # Note: Supabase will return geom as GeoJSON
-        now = datetime.utcnow().isoformat() + 'Z'  # Add Z to indicate UTC
-        
-        checkins_response = supabase.table('checkins').select(
-            '*, users!checkins_user_id_fkey(username)'
-        ).in_(
-            'user_id', friend_ids
-        ).gt(
-            'expires_at', now
-        ).order('created_at', desc=True).execute()
-        
-        # Format response with coordinates extracted from geometry
-        formatted_checkins = []
-        for checkin in checkins_response.data:
-            # Parse geometry to get coordinates
-            geom = checkin.get('geom')
-            
-            # If geom is a dict with coordinates (GeoJSON format)
-            if isinstance(geom, dict) and 'coordinates' in geom:
-                lng, lat = geom['coordinates']
-            else:
-                # Fallback: try to parse WKT format if needed
-                lat, lng = 0, 0
-            
-            # Get attendees for this check-in
-            attendees_response = supabase.table('attendees').select(
-                'user_id, users!attendees_user_id_fkey(username)'
-            ).eq('checkin_id', checkin['id']).execute()
-            
-            attendees = [
-                {
-                    'user_id': att['user_id'],
-                    'username': att['users']['username']
-                }
-                for att in attendees_response.data
-            ]
-            
-            # Ensure timestamps have Z suffix for proper timezone handling
-            expires_at = checkin['expires_at']
-            if not expires_at.endswith('Z'):
-                expires_at = expires_at + 'Z'
-            
-            created_at = checkin['created_at']
-            if not created_at.endswith('Z'):
-                created_at = created_at + 'Z'
-                
-            # --- VISIBILITY CHECK ---
-            checkin_visibility = checkin.get('visibility', 'everyone')
-            
-            # 1. My own check-in: Always show
-            if checkin['user_id'] == user_id:
-                pass 
-            # 2. Friend's check-in: Check visibility
-            else:
-                if checkin_visibility == 'specific':
-                    # Check if I am in the share_with list
-                    shared_list = checkin.get('share_with') or []
-                    if user_id not in shared_list:
-                        continue # Skip this check-in
-            
-            formatted_checkins.append({
-                'id': checkin['id'],
-                'user_id': checkin['user_id'],
-                'username': checkin['users']['username'] if checkin.get('users') else 'Unknown',
-                'location_name': checkin['location_name'],
-                'message': checkin['message'],
-                'lat': lat,
-                'lng': lng,
-                'expires_at': expires_at,
-                'created_at': created_at,
-                'attendees': attendees,
-                'visibility': checkin_visibility
-            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Radius limits for /api/nearby, in meters
+NEARBY_DEFAULT_RADIUS = int(os.getenv('NEARBY_DEFAULT_RADIUS', 1500))
+NEARBY_MAX_RADIUS = int(os.getenv('NEARBY_MAX_RADIUS', 25000))
+
+
+@app.route('/api/nearby', methods=['GET'])
+def nearby():
+    """
+    Get active, visible friend check-ins near a point or inside a map viewport
+    Query params: user_id, and either
+        lat, lng, radius (meters, optional)         - sorted by distance
+        bbox=min_lng,min_lat,max_lng,max_lat        - optional lat/lng to sort by distance
+    Returns: { "checkins": [...] } (feed shape plus "distance_m" when a center is given)
+    """
+    try:
+        user_id = request.args.get('user_id')
         
-        return jsonify({'checkins': formatted_checkins}), 200
+        if not user_id:
+            return jsonify({'error': 'user_id required'}), 400
+
+        try:
+            lat = request.args.get('lat', type=float)
+            lng = request.args.get('lng', type=float)
+            bbox = request.args.get('bbox')
+            bbox = [float(v) for v in bbox.split(',')] if bbox else None
+        except ValueError:
+            return jsonify({'error': 'lat, lng and bbox must be numbers'}), 400
+
+        if (lat is None) != (lng is None):
+            return jsonify({'error': 'lat and lng must be given together'}), 400
+
+        params = {'viewer_id': user_id, 'center_lat': lat, 'center_lng': lng}
+
+        if bbox:
+            if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                return jsonify({'error': 'bbox must be min_lng,min_lat,max_lng,max_lat'}), 400
+            params.update(zip(('min_lng', 'min_lat', 'max_lng', 'max_lat'), bbox))
+        elif lat is not None:
+            radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS, type=float)
+            params['radius_m'] = min(max(radius, 1), NEARBY_MAX_RADIUS)
+        else:
+            return jsonify({'error': 'lat/lng or bbox required'}), 400
+
+        # ST_DWithin / bounding-box filter and visibility checks run in Postgres.
+        # See database/migrations/migration_nearby_rpc.sql
+        nearby_response = supabase.rpc('get_nearby_feed', params).execute()
+
+        checkins = []
+        for row in nearby_response.data:
+            checkin = format_feed_checkin(row)
+            if row.get('distance_m') is not None:
+                checkin['distance_m'] = round(row['distance_m'])
+            checkins.append(checkin)
+
+        return jsonify({'checkins': checkins}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Map clustering for /api/feed/clusters: check-ins are binned into CLUSTER_CELL_PX square cells of the
+# Web Mercator map at the requested zoom (what Leaflet draws), per viewer and zoom level
+CLUSTER_CELL_PX = int(os.getenv('CLUSTER_CELL_PX', 60))
+CLUSTER_MAX_ZOOM = 22
+# Feed points per viewer, and clusters per (viewer, zoom); short-lived so new check-ins show up quickly
+cluster_points_cache = TTLCache(
+    maxsize=int(os.getenv('CLUSTER_CACHE_SIZE', 2048)),
+    ttl=int(os.getenv('CLUSTER_CACHE_TTL', 30))
+)
+cluster_cache = TTLCache(
+    maxsize=int(os.getenv('CLUSTER_CACHE_SIZE', 2048)) * 4,
+    ttl=int(os.getenv('CLUSTER_CACHE_TTL', 30))
+)
+_numpy = None
+
+
+def get_numpy():
+    """NumPy, imported on first use so cold starts don't pay for it; False when it isn't installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def cluster_checkins(ids, lats, lngs, zoom, cell_px=CLUSTER_CELL_PX):
+    """
+    Grid-cluster check-in coordinates at a map zoom level
+    Returns clusters sorted by size: {lat, lng (centroid), count, bounds: [min_lng, min_lat, max_lng, max_lat]}
+    plus "checkin_id" for single check-ins. Vectorized with NumPy when installed, plain Python otherwise.
+    """
+    if not ids:
+        return []
+    cells = 256 * 2 ** zoom / cell_px  # grid cells across the whole world
+    np = get_numpy()
+
+    if np:
+        lat = np.asarray(lats, dtype=np.float64)
+        lng = np.asarray(lngs, dtype=np.float64)
+        x = np.floor((lng + 180) / 360 * cells).astype(np.int64)
+        sin_lat = np.clip(np.sin(np.radians(lat)), -0.9999, 0.9999)
+        y = np.floor((0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * cells).astype(np.int64)
+        _, first, inverse, counts = np.unique(
+            x * (int(cells) + 1) + y, return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.ravel()
+        n = len(counts)
+        bounds = np.empty((4, n))
+        for row, values, initial, reduce in ((0, lng, np.inf, np.minimum), (1, lat, np.inf, np.minimum),
+                                             (2, lng, -np.inf, np.maximum), (3, lat, -np.inf, np.maximum)):
+            bounds[row].fill(initial)
+            reduce.at(bounds[row], inverse, values)
+        groups = zip(
+            (np.bincount(inverse, weights=lat, minlength=n) / counts).tolist(),
+            (np.bincount(inverse, weights=lng, minlength=n) / counts).tolist(),
+            counts.tolist(), bounds.T.tolist(), first.tolist()
+        )
+    else:
+        cells_by_key = {}
+        for i, (lat, lng) in enumerate(zip(lats, lngs)):
+            sin_lat = min(max(math.sin(math.radians(lat)), -0.9999), 0.9999)
+            key = (math.floor((lng + 180) / 360 * cells),
+                   math.floor((0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * cells))
+            cell = cells_by_key.get(key)
+            if cell is None:
+                cells_by_key[key] = [lat, lng, 1, [lng, lat, lng, lat], i]
+            else:
+                cell[0] += lat
+                cell[1] += lng
+                cell[2] += 1
+                b = cell[3]
+                b[0], b[1], b[2], b[3] = min(b[0], lng), min(b[1], lat), max(b[2], lng), max(b[3], lat)
+        groups = ((lat / n, lng / n, n, b, i) for lat, lng, n, b, i in cells_by_key.values())
+
+    clusters = []
+    for lat, lng, count, bounds, first_index in groups:
+        cluster = {'lat': lat, 'lng': lng, 'count': count, 'bounds': bounds}
+        if count == 1:
+            cluster['checkin_id'] = ids[first_index]
+        clusters.append(cluster)
+    clusters.sort(key=lambda c: (-c['count'], c['lat'], c['lng']))
+    return clusters
+
+
+@app.route('/api/feed/clusters', methods=['GET'])
+def feed_clusters():
+    """
+    Friend check-ins from the feed, grouped into map clusters so the client draws tens of markers, not hundreds
+    Query params: user_id, zoom (map zoom level, 0-22), bbox=min_lng,min_lat,max_lng,max_lat (optional viewport)
+    Returns: { "clusters": [{ "lat", "lng", "count", "bounds", "checkin_id" (single check-ins only) }],
+               "zoom": n, "total": check-ins in the viewport }
+    Clusters are cached per viewer and zoom for CLUSTER_CACHE_TTL seconds, so panning doesn't re-query.
+    """
+    try:
+        user_id = request.args.get('user_id')
+
+        if not user_id:
+            return jsonify({'error': 'user_id required'}), 400
+
+        try:
+            zoom = request.args.get('zoom', type=int)
+            bbox = request.args.get('bbox')
+            bbox = [float(v) for v in bbox.split(',')] if bbox else None
+        except ValueError:
+            return jsonify({'error': 'bbox must be numbers'}), 400
+
+        if zoom is None or not 0 <= zoom <= CLUSTER_MAX_ZOOM:
+            return jsonify({'error': f'zoom must be an integer from 0 to {CLUSTER_MAX_ZOOM}'}), 400
+        if bbox and (len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]):
+            return jsonify({'error': 'bbox must be min_lng,min_lat,max_lng,max_lat'}), 400
+
+        clusters = cluster_cache.get((user_id, zoom))
+        if clusters is None:
+            points = cluster_points_cache.get(user_id)
+            if points is None:
+                # Same visibility rules as /api/feed (see database/migrations/migration_feed_rpc.sql)
+                rows = supabase.rpc('get_feed', {'viewer_id': user_id}).execute().data
+                rows = [r for r in rows if r.get('lat') is not None and r.get('lng') is not None]
+                points = ([r['id'] for r in rows], [r['lat'] for r in rows], [r['lng'] for r in rows])
+                cluster_points_cache.set(user_id, points)
+            clusters = cluster_checkins(*points, zoom)
+            cluster_cache.set((user_id, zoom), clusters)
+
+        if bbox:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            clusters = [c for c in clusters if min_lng <= c['lng'] <= max_lng and min_lat <= c['lat'] <= max_lat]
+
+        response = jsonify({'clusters': clusters, 'zoom': zoom, 'total': sum(c['count'] for c in clusters)})
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/coming', methods=['POST'])
+@rate_limited('coming')
 def coming():
     """
     Mark user as coming to a check-in
@@ -836,10 +3045,46 @@ def delete_checkin(checkin_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics for this worker process
+    Requires "Authorization: Bearer <METRICS_TOKEN>"; without METRICS_TOKEN the endpoint is off (404)
+    """
+    token = os.getenv('METRICS_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/cron/sweep', methods=['GET', 'POST'])
+def cron_sweep():
+    """
+    Vercel cron entry point for the expired check-in sweeper
+    Requires "Authorization: Bearer <CRON_SECRET>" (Vercel sends it automatically)
+    """
+    cron_secret = os.getenv('CRON_SECRET')
+    # Constant-time compare; bytes, since compare_digest rejects non-ASCII str
+    if not cron_secret or not secrets.compare_digest(
+            request.headers.get('Authorization', '').encode(), f'Bearer {cron_secret}'.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        moved = sweep_expired_checkins()
+        evicted = rate_limiter.backend.evict_idle()
+        return jsonify({'success': True, 'archived': moved, 'rate_limit_buckets_evicted': evicted}), 200
+    except Exception as e:
+        print(f"Sweep error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== FRIENDS ROUTES ====================
 
 @app.route('/api/friends/add', methods=['POST'])
 @login_required
+@rate_limited('friends_add')
 def add_friend():
     """
     Send a friend request by email
@@ -852,62 +3097,42 @@ def add_friend():
         if not friend_email:
             return jsonify({'error': 'Friend email required'}), 400
         
-        # Find the friend by email
-        friend_response = supabase.table('users').select('*').eq('email', friend_email).execute()
+        # Lookup, state check and both-direction writes happen in one transaction.
+        # See database/migrations/migration_friendship_rpc.sql
+        result = supabase.rpc('friend_request', {
+            'actor_id': current_user.id,
+            'friend_email': friend_email
+        }).execute().data[0]
+        outcome = result['outcome']
+        friend_id = result['friend_id']
         
-        if not friend_response.data or len(friend_response.data) == 0:
+        if outcome == 'not_found':
             return jsonify({'error': 'User with that email not found'}), 404
-        
-        friend = friend_response.data[0]
-        friend_id = friend['id']
-        
-        # Can't add yourself
-        if friend_id == current_user.id:
+        if outcome == 'self':
             return jsonify({'error': 'Cannot add yourself as a friend'}), 400
+        if outcome == 'already_pending':
+            return jsonify({'error': 'Friend request already pending'}), 400
+        if outcome == 'already_friends':
+            return jsonify({'error': 'Already friends'}), 400
         
-        # Check if friendship already exists
-        existing = supabase.table('friendships').select('*').eq(
-            'user_id', current_user.id
-        ).eq('friend_id', friend_id).execute()
+        invalidate_friends(current_user.id, friend_id)
+        friendship = {'outgoing': result['outgoing_status'], 'incoming': result['incoming_status']}
         
-        if existing.data and len(existing.data) > 0:
-            status = existing.data[0]['status']
-            if status == 'pending':
-                return jsonify({'error': 'Friend request already pending'}), 400
-            elif status == 'accepted':
-                return jsonify({'error': 'Already friends'}), 400
-        
-        # Check if the reverse friendship exists (they added you)
-        reverse = supabase.table('friendships').select('*').eq(
-            'user_id', friend_id
-        ).eq('friend_id', current_user.id).execute()
-        
-        if reverse.data and len(reverse.data) > 0:
-            # If they sent you a request, this should accept it instead
-            if reverse.data[0]['status'] == 'pending':
-                # Accept their request
-                supabase.table('friendships').update({
-                    'status': 'accepted'
-                }).eq('user_id', friend_id).eq('friend_id', current_user.id).execute()
-                
-                # Create the reverse friendship
-                supabase.table('friendships').insert({
-                    'user_id': current_user.id,
-                    'friend_id': friend_id,
-                    'status': 'accepted'
-                }).execute()
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'You are now friends with {friend["username"]}!'
-                }), 201
-        
-        # Create friend request
-        supabase.table('friendships').insert({
-            'user_id': current_user.id,
-            'friend_id': friend_id,
-            'status': 'pending'
-        }).execute()
+        if outcome == 'accepted':
+            # They had already sent us a request, so this accepted it
+            create_notifications(
+                [friend_id], 
+                current_user.id, 
+                'friend_accept', 
+                "Friend Request Accepted", 
+                f"{current_user.username} accepted your friend request!",
+                current_user.id
+            )
+            return jsonify({
+                'success': True,
+                'message': f'You are now friends with {result["friend_username"]}!',
+                'friendship': friendship
+            }), 201
         
         # Notification
         create_notifications(
@@ -921,13 +3146,93 @@ def add_friend():
         
         return jsonify({
             'success': True,
-            'message': f'Friend request sent to {friend["username"]}'
+            'message': f'Friend request sent to {result["friend_username"]}',
+            'friendship': friendship
         }), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Most emails accepted by one /api/friends/add-bulk call
+BULK_FRIEND_LIMIT = int(os.getenv('BULK_FRIEND_LIMIT', 50))
+
+
+@app.route('/api/friends/add-bulk', methods=['POST'])
+@login_required
+@rate_limited('friends_add_bulk')
+def add_friends_bulk():
+    """
+    Send friend requests to several emails at once
+    Accepts: { "friend_emails": ["a@example.com", "b@example.com"] }
+    Returns: { "results": [{"email", "status", "username"}], "summary": {status: count} }
+    status: requested | accepted | already_friends | already_pending | not_found | self
+    """
+    try:
+        data = request.json
+        raw_emails = data.get('friend_emails')
+
+        if not isinstance(raw_emails, list) or not raw_emails:
+            return jsonify({'error': 'friend_emails must be a non-empty list'}), 400
+
+        # Keep the caller's order, drop blanks and duplicates
+        emails = list(dict.fromkeys(e.strip() for e in raw_emails if isinstance(e, str) and e.strip()))
+        if not emails:
+            return jsonify({'error': 'friend_emails must contain at least one email'}), 400
+        if len(emails) > BULK_FRIEND_LIMIT:
+            return jsonify({'error': f'At most {BULK_FRIEND_LIMIT} emails per request'}), 400
+
+        # Lookups, state checks and writes for every email in one transaction, under the same
+        # per-pair locks as single adds. See database/migrations/migration_friendship_rpc.sql
+        rows = supabase.rpc('friend_request_bulk', {
+            'actor_id': current_user.id,
+            'friend_emails': emails
+        }).execute().data
+
+        results = []
+        to_request, to_accept = [], []
+        for row in rows:
+            result = {'email': row['email'], 'status': row['outcome']}
+            if row['friend_username'] is not None:
+                result['username'] = row['friend_username']
+            results.append(result)
+            if row['outcome'] == 'requested':
+                to_request.append(row['friend_id'])
+            elif row['outcome'] == 'accepted':
+                # They already asked us, so this accepted their request
+                to_accept.append(row['friend_id'])
+
+        if to_request or to_accept:
+            invalidate_friends(current_user.id, *to_accept, *to_request)
+
+        # One notification batch per kind
+        create_notifications(
+            to_request,
+            current_user.id,
+            'friend_request',
+            "New Friend Request",
+            f"{current_user.username} wants to be friends!",
+            current_user.id
+        )
+        create_notifications(
+            to_accept,
+            current_user.id,
+            'friend_accept',
+            "Friend Request Accepted",
+            f"{current_user.username} accepted your friend request!",
+            current_user.id
+        )
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        return jsonify({'success': True, 'results': results, 'summary': summary}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/friends/requests', methods=['GET'])
 @login_required
 def get_friend_requests():
@@ -969,31 +3274,32 @@ def accept_friend_request():
         if not requester_id:
             return jsonify({'error': 'user_id required'}), 400
         
-        # Update the original request to accepted
-        supabase.table('friendships').update({
-            'status': 'accepted'
-        }).eq('user_id', requester_id).eq('friend_id', current_user.id).execute()
+        # Accept + reverse friendship in one transaction
+        result = supabase.rpc('friend_accept', {
+            'actor_id': current_user.id,
+            'requester_id': requester_id
+        }).execute().data[0]
         
-        # Create the reverse friendship
-        supabase.table('friendships').insert({
-            'user_id': current_user.id,
-            'friend_id': requester_id,
-            'status': 'accepted'
-        }).execute()
+        if result['outcome'] == 'no_request':
+            return jsonify({'error': 'No pending friend request from that user'}), 404
         
-        # Notification
-        create_notifications(
-            [requester_id], 
-            current_user.id, 
-            'friend_accept', 
-            "Friend Request Accepted", 
-            f"{current_user.username} accepted your friend request!",
-            current_user.id
-        )
+        invalidate_friends(current_user.id, requester_id)
+        
+        if result['outcome'] == 'accepted':
+            # Notification
+            create_notifications(
+                [requester_id], 
+                current_user.id, 
+                'friend_accept', 
+                "Friend Request Accepted", 
+                f"{current_user.username} accepted your friend request!",
+                current_user.id
+            )
         
         return jsonify({
             'success': True,
-            'message': 'Friend request accepted'
+            'message': 'Friend request accepted',
+            'friendship': {'outgoing': result['outgoing_status'], 'incoming': result['incoming_status']}
         }), 200
         
     except Exception as e:
@@ -1014,14 +3320,50 @@ def reject_friend_request():
         if not requester_id:
             return jsonify({'error': 'user_id required'}), 400
         
-        # Delete the friend request
-        supabase.table('friendships').delete().eq(
-            'user_id', requester_id
-        ).eq('friend_id', current_user.id).execute()
+        # Only ever deletes a *pending* request, never an accepted friendship
+        result = supabase.rpc('friend_reject', {
+            'actor_id': current_user.id,
+            'requester_id': requester_id
+        }).execute().data[0]
+        invalidate_friends(current_user.id, requester_id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Friend request rejected' if result['outcome'] == 'rejected' else 'No pending friend request',
+            'friendship': {'outgoing': result['outgoing_status'], 'incoming': result['incoming_status']}
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/friends/remove', methods=['POST'])
+@login_required
+def remove_friend():
+    """
+    Unfriend someone (removes both directions)
+    Accepts: { "user_id": "uuid" }
+    """
+    try:
+        data = request.json
+        friend_id = data.get('user_id')
+        
+        if not friend_id:
+            return jsonify({'error': 'user_id required'}), 400
+        
+        result = supabase.rpc('friend_remove', {
+            'actor_id': current_user.id,
+            'other_id': friend_id
+        }).execute().data[0]
+        invalidate_friends(current_user.id, friend_id)
+        
+        if result['outcome'] == 'not_friends':
+            return jsonify({'error': 'Not friends'}), 404
         
         return jsonify({
             'success': True,
-            'message': 'Friend request rejected'
+            'message': 'Friend removed',
+            'friendship': {'outgoing': None, 'incoming': None}
         }), 200
         
     except Exception as e:
@@ -1034,18 +3376,7 @@ def get_friends():
     """Get list of accepted friends for current user"""
     try:
         # Get accepted friendships
-        friends_response = supabase.table('friendships').select(
-            '*, users!friendships_friend_id_fkey(id, username, email)'
-        ).eq('user_id', current_user.id).eq('status', 'accepted').execute()
-        
-        friends = [
-            {
-                'user_id': friend['users']['id'],
-                'username': friend['users']['username'],
-                'email': friend['users']['email']
-            }
-            for friend in friends_response.data
-        ]
+        friends = get_accepted_friends(current_user.id)
         
         return jsonify({'friends': friends}), 200
         
@@ -1054,59 +3385,227 @@ def get_friends():
 
 
 
+# ==================== PLACES ROUTES ====================
+
+@app.route('/api/places/search', methods=['GET'])
+@login_required
+def places_search():
+    """
+    Autocomplete places in New Haven
+    Query params: q, limit (default 5, max 10)
+    Returns: { "results": [{"name", "address", "lat", "lng", "source"}, ...] }
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 10)
+
+        if not query:
+            return jsonify({'results': []}), 200
+
+        results = [
+            {k: place.get(k) for k in ('name', 'address', 'lat', 'lng', 'source')}
+            for place in search_places(query, limit, current_user.id)
+        ]
+        return jsonify({'results': results}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/places/reverse', methods=['GET'])
+@login_required
+@rate_limited('places_reverse')
+def places_reverse():
+    """
+    Reverse geocode a point to a place name (signed-in users only: cache misses go to Nominatim)
+    Query params: lat, lng, precision (optional geohash precision, 5-9)
+    Returns: { "name", "address", "lat", "lng", "source", "geohash" }
+    """
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        precision = request.args.get('precision', type=int)
+
+        if lat is None or lng is None:
+            return jsonify({'error': 'lat and lng required'}), 400
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'error': 'lat/lng out of range'}), 400
+        if precision is not None:
+            precision = min(max(precision, 5), 9)
+
+        return jsonify(reverse_geocode(lat, lng, precision)), 200
+
+    except GeocoderThrottled as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response, 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== NOTIFICATION ROUTES ====================
 
 @app.route('/api/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    """Get notifications for current user"""
+    """
+    Get notifications for current user, newest first
+    Query params: limit (default 50, max 100), before (next_cursor from the previous page)
+    Returns: { "notifications": [...], "next_cursor": "..." or null,
+               "latest_cursor": "..." (first page only: pass as ?since= to /api/notifications/stream) }
+    """
     try:
-        # Get last 50 notifications
-        # Avoiding complex join syntax to prevent FK naming errors
-        response = supabase.table('notifications').select('*').eq(
-            'user_id', current_user.id
-        ).order('created_at', desc=True).limit(50).execute()
-        
-        raw_notifs = response.data if response.data else []
-        
-        # Collect sender IDs to fetch usernames
-        sender_ids = set()
-        for n in raw_notifs:
-            if n.get('sender_id'):
-                sender_ids.add(n['sender_id'])
-                
-        # Fetch usernames
-        sender_map = {}
-        if sender_ids:
-            users_response = supabase.table('users').select('id, username').in_('id', list(sender_ids)).execute()
-            if users_response.data:
-                for u in users_response.data:
-                    sender_map[u['id']] = u['username']
-        
-        notifications = []
-        for n in raw_notifs:
-            sender_name = 'System'
-            if n.get('sender_id') and n['sender_id'] in sender_map:
-                sender_name = sender_map[n['sender_id']]
-                
-            notifications.append({
-                'id': n['id'],
-                'type': n['type'],
-                'title': n['title'],
-                'body': n['body'],
-                'is_read': n['is_read'],
-                'created_at': n['created_at'],
-                'sender_username': sender_name,
-                'related_id': n['related_id']
-            })
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        query = supabase.table('notifications').select(NOTIFICATION_COLUMNS).eq('user_id', current_user.id)
+
+        before = request.args.get('before')
+        if before:
+            try:
+                created_at, notification_id = decode_notification_cursor(before)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # Keyset: strictly older than the cursor row, ties on created_at broken by id
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{notification_id})'
+            )
+
+        # Fetch one extra row to know whether another page exists
+        response = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+        rows = response.data or []
+
+        next_cursor = encode_notification_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+
+        sender_map = notification_sender_map(rows)
+        notifications = [format_notification(n, sender_map) for n in rows]
             
-        return jsonify({'notifications': notifications}), 200
+        payload = {'notifications': notifications, 'next_cursor': next_cursor}
+        if not before:
+            payload['latest_cursor'] = encode_notification_cursor(rows[0]) if rows else None
+        return jsonify(payload), 200
         
     except Exception as e:
         print(f"Error fetching notifications: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/notifications/unread-count', methods=['GET'])
+@login_required
+def get_unread_notification_count():
+    """
+    Get the number of unread notifications for the badge
+    Returns: { "unread_count": 3 }
+    """
+    try:
+        # HEAD + count=exact: Postgres counts, no rows are transferred
+        response = supabase.table('notifications').select('id', count='exact', head=True).eq(
+            'user_id', current_user.id
+        ).eq('is_read', False).execute()
+
+        return jsonify({'unread_count': response.count or 0}), 200
+
+    except Exception as e:
+        print(f"Error counting notifications: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def notifications_after(user_id, cursor, limit=50):
+    """Notification rows for user_id strictly after a (created_at, id) cursor, oldest first"""
+    query = supabase.table('notifications').select(NOTIFICATION_COLUMNS).eq('user_id', user_id)
+    if cursor:
+        created_at, notification_id = cursor
+        query = query.or_(
+            f'created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt.{notification_id})'
+        )
+    return query.order('created_at').order('id').limit(limit).execute().data or []
+
+
+@app.route('/api/notifications/stream', methods=['GET'])
+@login_required
+def notification_stream():
+    """
+    Server-Sent Events stream of new notifications for the current user
+    Emits "notification" events (same shape as /api/notifications items, id = notification cursor)
+    and a comment heartbeat every NOTIFICATION_STREAM_HEARTBEAT seconds.
+    Replays everything after the client's cursor: Last-Event-ID, else ?since= (latest_cursor from
+    /api/notifications), else the newest notification at connect time.
+    New rows are read from the database every NOTIFICATION_STREAM_POLL seconds, so notifications
+    created by any worker or instance are delivered.
+    Returns 204 when streaming is disabled (see NOTIFICATION_STREAM); EventSource then stops and
+    the client keeps polling /api/notifications.
+    """
+    if not notification_stream_enabled(request.environ):
+        return '', 204
+
+    user_id = current_user.id
+    cursor = None
+    for value in (request.headers.get('Last-Event-ID'), request.args.get('since')):
+        if value:
+            try:
+                cursor = decode_notification_cursor(value)
+                break
+            except ValueError:
+                pass
+
+    # Subscribe before the first query so a wake-up in between is not lost
+    events = notification_broker.subscribe(user_id)
+
+    def generate():
+        nonlocal cursor
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield f'retry: {NOTIFICATION_STREAM_HEARTBEAT * 1000}\n\n'
+
+            if cursor is None:
+                newest = supabase.table('notifications').select('created_at, id').eq(
+                    'user_id', user_id
+                ).order('created_at', desc=True).order('id', desc=True).limit(1).execute()
+                cursor = (newest.data[0]['created_at'], newest.data[0]['id']) if newest.data else None
+
+            deadline = time.monotonic() + NOTIFICATION_STREAM_MAX_SECONDS
+            last_write = time.monotonic()
+            while time.monotonic() < deadline:
+                try:
+                    rows = notifications_after(user_id, cursor)
+                except Exception as e:
+                    print(f"Notification stream query error: {e}")
+                    rows = []
+                if rows:
+                    sender_map = notification_sender_map(rows)
+                    for row in rows:
+                        cursor = (row['created_at'], row['id'])
+                        yield format_sse(
+                            'notification', format_notification(row, sender_map), encode_notification_cursor(row)
+                        )
+                    last_write = time.monotonic()
+                    if len(rows) == 50:
+                        continue  # more waiting - keep reading before sleeping
+                elif time.monotonic() - last_write >= NOTIFICATION_STREAM_HEARTBEAT:
+                    yield ': heartbeat\n\n'
+                    last_write = time.monotonic()
+
+                try:
+                    events.get(timeout=NOTIFICATION_STREAM_POLL)
+                    while True:
+                        events.get_nowait()  # one query covers every queued wake-up
+                except queue.Empty:
+                    pass
+        finally:
+            notification_broker.unsubscribe(user_id, events)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/fcm-token', methods=['POST'])
 @login_required
 def save_fcm_token():
@@ -1121,6 +3620,7 @@ def save_fcm_token():
         supabase.table('users').update({
             'fcm_token': token
         }).eq('id', current_user.id).execute()
+        user_cache.invalidate(current_user.id)
         
         return jsonify({'success': True, 'message': 'Token saved'}), 200
     except Exception as e:
@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for the Flask backend
+Runs app.py against an in-memory Supabase stand-in (fake_supabase) filled with a synthetic
+social graph (generate), so route latency and database round trips can be measured and
+compared between commits without touching production.
+
+Usage (from the repository root):
+    python -m benchmarks.run --output bench.json
+"""
@@ -0,0 +1,87 @@
+"""
+Map clustering benchmark
+Times cluster_checkins (the binning behind /api/feed/clusters) with NumPy and with the plain-Python
+fallback on synthetic check-ins around downtown New Haven, and reports how many markers the map
+would draw per zoom level instead of one per check-in.
+
+    python -m benchmarks.clusters --points 100 1000 10000 --zoom 12 14 16
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmarks.generate import VENUES
+from benchmarks.run import git_commit, load_app
+
+
+def synthetic_checkins(n, rng):
+    """Check-ins scattered within ~150 m of the generator's venues, so they pile up downtown like real ones"""
+    ids, lats, lngs = [], [], []
+    for i in range(n):
+        _, lat, lng = rng.choice(VENUES)
+        ids.append(f'checkin-{i}')
+        lats.append(lat + rng.gauss(0, 0.0015))
+        lngs.append(lng + rng.gauss(0, 0.0015))
+    return ids, lats, lngs
+
+
+def time_ms(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1000, 4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Map clustering benchmark')
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--zoom', type=int, nargs='+', default=[12, 14, 16])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        hangouts = load_app()
+        numpy = hangouts.get_numpy()
+        rng = random.Random(args.seed)
+
+        results = {}
+        for n in args.points:
+            points = synthetic_checkins(n, rng)
+            for zoom in args.zoom:
+                run = lambda: hangouts.cluster_checkins(*points, zoom)
+                result = {'clusters': len(run())}
+                if numpy:
+                    result['numpy_ms'] = time_ms(run, args.iterations)
+                hangouts._numpy = False
+                result['python_ms'] = time_ms(run, args.iterations)
+                hangouts._numpy = None
+                results[f'{n}_points_zoom_{zoom}'] = result
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'numpy': numpy.__version__ if numpy else None,
+                'params': {k: v for k, v in vars(args).items() if k != 'output'},
+            },
+            'results': results,
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,648 @@
+"""
+In-memory stand-in for the Supabase client used by app.py
+Implements the slice of the PostgREST query builder the app calls
+(table().select().eq().in_().gt().lt().or_().order().limit().execute(), insert, update,
+upsert, delete) plus the Postgres functions from database/migrations as Python rpc() handlers.
+
+Every execute() counts as one database round trip and can sleep for a configurable
+latency, so benchmarks measure both app-side work and how chatty each route is.
+"""
+
+import math
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class FakeAPIError(Exception):
+    """Raised where PostgREST would return an error (unknown table/rpc, duplicate key, foreign key)"""
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# Primary keys and column defaults, mirroring database/schema.sql and the migrations
+TABLES = {
+    'users': {'pk': ('id',), 'defaults': {'phone': None, 'fcm_token': None}},
+    'friendships': {'pk': ('user_id', 'friend_id'), 'defaults': {'status': 'pending'}},
+    'checkins': {'pk': ('id',), 'defaults': {'message': None, 'visibility': 'everyone', 'share_with': None}},
+    'attendees': {'pk': ('checkin_id', 'user_id'), 'defaults': {'status': 'coming'}},
+    'notifications': {'pk': ('id',), 'defaults': {'sender_id': None, 'related_id': None, 'is_read': False}},
+    'checkins_archive': {'pk': ('id',), 'defaults': {}},
+    'user_checkin_totals': {'pk': ('user_id',), 'defaults': {'total': 0}},
+    'user_place_counts': {'pk': ('user_id', 'location_name'), 'defaults': {'count': 0}},
+    'place_counts': {'pk': ('location_name',), 'defaults': {'count': 0}},
+    'rate_limit_buckets': {'pk': ('key',), 'defaults': {}},
+}
+
+# Foreign keys used for embedding (name -> local column, referenced table)
+FOREIGN_KEYS = {
+    'friendships_friend_id_fkey': ('friend_id', 'users'),
+    'friendships_user_id_fkey': ('user_id', 'users'),
+    'checkins_user_id_fkey': ('user_id', 'users'),
+    'notifications_sender_id_fkey': ('sender_id', 'users'),
+}
+
+# ON DELETE CASCADE: table -> [(child table, child column, parent column)]
+CASCADES = {
+    'users': [
+        # Postgres makes no promise about the order of cascaded deletes; the rollups go first here
+        # so a trigger that re-inserts them for a deleted user fails like it would there.
+        ('user_checkin_totals', 'user_id', 'id'),
+        ('user_place_counts', 'user_id', 'id'),
+        ('friendships', 'user_id', 'id'),
+        ('friendships', 'friend_id', 'id'),
+        ('checkins', 'user_id', 'id'),
+        ('attendees', 'user_id', 'id'),
+        ('notifications', 'user_id', 'id'),
+        ('checkins_archive', 'user_id', 'id'),
+    ],
+    'checkins': [('attendees', 'checkin_id', 'id')],
+}
+
+
+def utcnow_iso():
+    return datetime.utcnow().isoformat()
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.rstrip('Z'))
+
+
+def parse_point(geom):
+    """'POINT(lng lat)' -> (lat, lng)"""
+    lng, lat = re.match(r'POINT\(\s*([-\d.]+)\s+([-\d.]+)\s*\)', geom).groups()
+    return float(lat), float(lng)
+
+
+def coerce(column, a, b):
+    """Bring a stored value and a filter value to comparable types"""
+    if a is None or b is None:
+        return a, b
+    if column.endswith('_at') and isinstance(a, str) and isinstance(b, str):
+        return parse_timestamp(a), parse_timestamp(b)
+    if isinstance(a, bool) and isinstance(b, str):
+        return a, b.lower() == 'true'
+    if isinstance(a, (int, float)) and not isinstance(a, bool) and isinstance(b, str):
+        return a, float(b)
+    if type(a) is not type(b):
+        return str(a), str(b)
+    return a, b
+
+
+def compare(column, op, value):
+    def predicate(row):
+        a, b = coerce(column, row.get(column), value)
+        if op == 'eq':
+            return a == b
+        if op == 'in':
+            return any(x == y for x, y in (coerce(column, row.get(column), v) for v in value))
+        if a is None or b is None:
+            return False
+        return {'lt': a < b, 'lte': a <= b, 'gt': a > b, 'gte': a >= b}[op]
+    return predicate
+
+
+def split_top_level(text):
+    """Split on commas that are not inside parentheses or quotes"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif char == '(' and not quoted:
+            depth += 1
+        elif char == ')' and not quoted:
+            depth -= 1
+        elif char == ',' and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ''
+            continue
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def parse_or_filter(expression):
+    """PostgREST logic tree syntax: 'a.eq.1,and(b.lt."x",c.in.(1,2))' -> predicate"""
+    predicates = []
+    for part in split_top_level(expression):
+        match = re.match(r'^(and|or)\((.*)\)$', part)
+        if match:
+            children = [parse_or_filter(p) for p in split_top_level(match.group(2))]
+            combine = all if match.group(1) == 'and' else any
+            predicates.append(lambda row, c=children, f=combine: f(p(row) for p in c))
+            continue
+        column, op, value = part.split('.', 2)
+        if op == 'in':
+            value = [v.strip('"') for v in split_top_level(value[1:-1])]
+        else:
+            value = value.strip('"')
+        predicates.append(compare(column, op, value))
+    return lambda row: any(p(row) for p in predicates)
+
+
+def parse_select(columns):
+    """'*, alias:users!fkey(a, b)' -> (plain column list or None for *, [(key, fkey, [cols])])"""
+    plain, embeds, star = [], [], False
+    for part in split_top_level(columns):
+        match = re.match(r'^(?:(\w+):)?(\w+)!(\w+)\((.*)\)$', part)
+        if match:
+            alias, table, fkey, inner = match.groups()
+            embeds.append((alias or table, fkey, [c.strip() for c in inner.split(',')]))
+        elif part == '*':
+            star = True
+        else:
+            plain.append(part)
+    return (None if star else plain), embeds
+
+
+class FakeDatabase:
+    """Table storage plus trigger emulation (stats rollups)"""
+
+    def __init__(self):
+        self.tables = {name: {} for name in TABLES}
+        self.lock = threading.RLock()
+
+    def key(self, table, row, columns=None):
+        return tuple(row.get(c) for c in (columns or TABLES[table]['pk']))
+
+    def insert_rows(self, table, rows, upsert_on=None):
+        spec = TABLES[table]
+        inserted = []
+        with self.lock:
+            for values in rows:
+                row = dict(spec['defaults'])
+                if 'id' in spec['pk']:
+                    row['id'] = str(uuid.uuid4())
+                if table not in ('user_checkin_totals', 'user_place_counts', 'place_counts'):
+                    row['created_at'] = utcnow_iso()
+                row.update(values)
+
+                if upsert_on:
+                    match_key = self.key(table, row, upsert_on)
+                    existing = next(
+                        (r for r in self.tables[table].values() if self.key(table, r, upsert_on) == match_key), None
+                    )
+                    if existing is not None:
+                        existing.update(values)
+                        inserted.append(dict(existing))
+                        continue
+
+                pk = self.key(table, row)
+                if pk in self.tables[table]:
+                    raise FakeAPIError(f'duplicate key value violates unique constraint "{table}_pkey"')
+                self.tables[table][pk] = row
+                inserted.append(dict(row))
+                self.after_insert(table, row)
+        return inserted
+
+    def delete_rows(self, table, rows, archiving=False):
+        with self.lock:
+            for row in rows:
+                self.tables[table].pop(self.key(table, row), None)
+                for child, child_column, parent_column in CASCADES.get(table, ()):
+                    children = [r for r in self.tables[child].values() if r.get(child_column) == row[parent_column]]
+                    self.delete_rows(child, children)
+                if not archiving:
+                    self.after_delete(table, row)
+
+    # --- trigger emulation: migration_stats_rollups.sql ---
+
+    def after_insert(self, table, row):
+        if table == 'checkins':
+            self.bump_stats(row['user_id'], row['location_name'], 1)
+
+    def after_delete(self, table, row):
+        if table == 'checkins':
+            self.bump_stats(row['user_id'], row['location_name'], -1)
+
+    def bump_stats(self, user_id, location_name, delta):
+        for table, pk, column in (
+            ('user_checkin_totals', (user_id,), 'total'),
+            ('user_place_counts', (user_id, location_name), 'count'),
+            ('place_counts', (location_name,), 'count'),
+        ):
+            rows = self.tables[table]
+            if pk not in rows:
+                if delta < 0:
+                    # migration_stats_rollups_delete_fix.sql: decrements never insert
+                    continue
+                if table != 'place_counts' and (user_id,) not in self.tables['users']:
+                    raise FakeAPIError(f'insert or update on table "{table}" violates foreign key constraint')
+                names = TABLES[table]['pk']
+                rows[pk] = dict(zip(names, pk), **{column: 0})
+            rows[pk][column] = max(rows[pk][column] + delta, 0)
+            if rows[pk][column] == 0 and table != 'user_checkin_totals':
+                del rows[pk]
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        if table not in TABLES:
+            raise FakeAPIError(f'relation "public.{table}" does not exist')
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.count = None
+        self.head = False
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.payload = None
+        self.on_conflict = None
+
+    def select(self, *columns, count=None, head=None):
+        self.columns = ', '.join(columns) if columns else '*'
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, rows):
+        self.operation = 'insert'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.operation = 'upsert'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = tuple(c.strip() for c in on_conflict.split(',')) if on_conflict else None
+        return self
+
+    def update(self, values):
+        self.operation = 'update'
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(compare(column, 'eq', value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(compare(column, 'gt', value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(compare(column, 'lt', value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(compare(column, 'in', list(values)))
+        return self
+
+    def or_(self, expression):
+        self.filters.append(parse_or_filter(expression))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def _matching(self):
+        return [r for r in self.client.db.tables[self.table].values() if all(f(r) for f in self.filters)]
+
+    def _project(self, row):
+        plain, embeds = parse_select(self.columns)
+        out = dict(row) if plain is None else {c: row.get(c) for c in plain}
+        for key, fkey, inner in embeds:
+            local_column, foreign_table = FOREIGN_KEYS[fkey]
+            target = self.client.db.tables[foreign_table].get((row.get(local_column),))
+            out[key] = {c: target.get(c) for c in inner} if target else None
+        return out
+
+    def execute(self):
+        self.client.record(self.table, self.operation)
+        db = self.client.db
+        with db.lock:
+            if self.operation in ('insert', 'upsert'):
+                return FakeResponse(db.insert_rows(self.table, self.payload, self.on_conflict))
+
+            rows = self._matching()
+
+            if self.operation == 'update':
+                for row in rows:
+                    row.update(self.payload)
+                return FakeResponse([dict(r) for r in rows])
+
+            if self.operation == 'delete':
+                deleted = [dict(r) for r in rows]
+                db.delete_rows(self.table, rows)
+                return FakeResponse(deleted)
+
+            for column, desc in reversed(self.orders):
+                present = [r for r in rows if r.get(column) is not None]
+                missing = [r for r in rows if r.get(column) is None]
+                present.sort(key=lambda r: coerce(column, r[column], r[column])[0], reverse=desc)
+                # Postgres: NULLS FIRST for DESC, NULLS LAST for ASC
+                rows = missing + present if desc else present + missing
+            count = len(rows) if self.count else None
+            if self.row_limit is not None:
+                rows = rows[:self.row_limit]
+            data = [] if self.head else [self._project(r) for r in rows]
+            return FakeResponse(data, count)
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        if name not in RPC_HANDLERS:
+            raise FakeAPIError(f'function public.{name} does not exist')
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        self.client.record(f'rpc:{self.name}', 'rpc')
+        with self.client.db.lock:
+            return FakeResponse(RPC_HANDLERS[self.name](self.client.db, **self.params))
+
+
+class FakeSupabase:
+    """
+    Drop-in for the module-level `supabase` client in app.py
+    latency_ms: simulated network + query time added to every execute()
+    """
+
+    def __init__(self, db=None, latency_ms=0.0):
+        self.db = db or FakeDatabase()
+        self.latency = latency_ms / 1000.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.calls_by_target = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params)
+
+    def record(self, target, operation):
+        with self._lock:
+            self.calls += 1
+            key = f'{target}.{operation}'
+            self.calls_by_target[key] = self.calls_by_target.get(key, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = 0
+            self.calls_by_target = {}
+
+
+# ==================== RPC HANDLERS ====================
+# Python versions of the functions in database/migrations/*.sql
+
+def _accepted_friend_ids(db, user_id):
+    return {
+        f['friend_id'] for f in db.tables['friendships'].values()
+        if f['user_id'] == user_id and f['status'] == 'accepted'
+    }
+
+
+def _visible_checkins(db, viewer_id):
+    """get_feed's WHERE clause: active, and mine or a friend's that is shared with me"""
+    now = datetime.utcnow()
+    friends = _accepted_friend_ids(db, viewer_id)
+    for c in db.tables['checkins'].values():
+        if parse_timestamp(c['expires_at']) <= now:
+            continue
+        if c['user_id'] == viewer_id or (
+            c['user_id'] in friends
+            and (c.get('visibility') != 'specific' or viewer_id in (c.get('share_with') or []))
+        ):
+            yield c
+
+
+def _feed_row(db, c):
+    lat, lng = parse_point(c['geom'])
+    users = db.tables['users']
+    attendees = [
+        {'user_id': a['user_id'], 'username': users[(a['user_id'],)]['username']}
+        for a in db.tables['attendees'].values()
+        if a['checkin_id'] == c['id'] and (a['user_id'],) in users
+    ]
+    return {
+        'id': c['id'],
+        'user_id': c['user_id'],
+        'username': users[(c['user_id'],)]['username'],
+        'location_name': c['location_name'],
+        'message': c.get('message'),
+        'lat': lat,
+        'lng': lng,
+        'expires_at': c['expires_at'].rstrip('Z'),
+        'created_at': c['created_at'],
+        'visibility': c.get('visibility') or 'everyone',
+        'attendees': attendees,
+    }
+
+
+def rpc_get_feed(db, viewer_id):
+    rows = [_feed_row(db, c) for c in _visible_checkins(db, viewer_id)]
+    rows.sort(key=lambda r: r['created_at'], reverse=True)
+    return rows
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371008.8 * 2 * math.asin(math.sqrt(a))
+
+
+def rpc_get_nearby_feed(db, viewer_id, center_lat=None, center_lng=None, radius_m=None,
+                        min_lng=None, min_lat=None, max_lng=None, max_lat=None):
+    rows = []
+    for c in _visible_checkins(db, viewer_id):
+        row = _feed_row(db, c)
+        row['distance_m'] = None
+        if center_lat is not None and center_lng is not None:
+            row['distance_m'] = haversine_m(center_lat, center_lng, row['lat'], row['lng'])
+        if radius_m is not None and row['distance_m'] > radius_m:
+            continue
+        if min_lng is not None and not (min_lng <= row['lng'] <= max_lng and min_lat <= row['lat'] <= max_lat):
+            continue
+        rows.append(row)
+    rows.sort(key=lambda r: r['created_at'], reverse=True)
+    rows.sort(key=lambda r: (r['distance_m'] is None, r['distance_m'] or 0))
+    return rows
+
+
+def _catalog_rows(db, include):
+    places = {}
+    for table in ('checkins', 'checkins_archive'):
+        for c in db.tables[table].values():
+            if c['location_name'] in (None, 'Unknown Location', 'Current Location') or not include(c):
+                continue
+            lat, lng = parse_point(c['geom'])
+            entry = places.setdefault(c['location_name'], [0.0, 0.0, 0, set()])
+            entry[0] += lat
+            entry[1] += lng
+            entry[2] += 1
+            entry[3].add(c['user_id'])
+    return places
+
+
+def rpc_get_place_catalog(db, min_users=3):
+    places = _catalog_rows(db, lambda c: c.get('visibility') != 'specific')
+    return [
+        {'location_name': name, 'lat': lat / n, 'lng': lng / n, 'count': n}
+        for name, (lat, lng, n, users) in places.items() if len(users) >= min_users
+    ]
+
+
+def rpc_get_user_places(db, viewer_id, max_places=200):
+    places = _catalog_rows(db, lambda c: c['user_id'] == viewer_id)
+    rows = [
+        {'location_name': name, 'lat': lat / n, 'lng': lng / n, 'count': n}
+        for name, (lat, lng, n, _) in places.items()
+    ]
+    return sorted(rows, key=lambda r: -r['count'])[:max_places]
+
+
+def rpc_archive_expired_checkins(db, batch_size=500, grace_minutes=60):
+    cutoff = datetime.utcnow().timestamp() - grace_minutes * 60
+    expired = sorted(
+        (c for c in db.tables['checkins'].values() if parse_timestamp(c['expires_at']).timestamp() < cutoff),
+        key=lambda c: c['expires_at']
+    )[:batch_size]
+    for c in expired:
+        attendees = [
+            {'user_id': a['user_id'], 'status': a['status'], 'created_at': a['created_at']}
+            for a in db.tables['attendees'].values() if a['checkin_id'] == c['id']
+        ]
+        archived = dict(c, attendees=attendees, archived_at=utcnow_iso())
+        db.tables['checkins_archive'][(c['id'],)] = archived
+    db.delete_rows('checkins', expired, archiving=True)
+    return len(expired)
+
+
+def _status(db, user_id, friend_id):
+    row = db.tables['friendships'].get((user_id, friend_id))
+    return row['status'] if row else None
+
+
+def _set_status(db, user_id, friend_id, status):
+    row = db.tables['friendships'].get((user_id, friend_id))
+    if row:
+        row['status'] = status
+    else:
+        db.insert_rows('friendships', [{'user_id': user_id, 'friend_id': friend_id, 'status': status}])
+
+
+def rpc_friend_request(db, actor_id, friend_email):
+    target = next((u for u in db.tables['users'].values() if u['email'] == friend_email), None)
+    if target is None:
+        return [{'outcome': 'not_found', 'friend_id': None, 'friend_username': None,
+                 'outgoing_status': None, 'incoming_status': None}]
+    friend_id = target['id']
+    if friend_id == actor_id:
+        outcome = 'self'
+    elif _status(db, actor_id, friend_id) == 'accepted':
+        outcome = 'already_friends'
+    elif _status(db, actor_id, friend_id) == 'pending':
+        outcome = 'already_pending'
+    elif _status(db, friend_id, actor_id) == 'pending':
+        _set_status(db, friend_id, actor_id, 'accepted')
+        _set_status(db, actor_id, friend_id, 'accepted')
+        outcome = 'accepted'
+    else:
+        _set_status(db, actor_id, friend_id, 'pending')
+        outcome = 'requested'
+    return [{
+        'outcome': outcome,
+        'friend_id': friend_id,
+        'friend_username': target['username'],
+        'outgoing_status': None if outcome == 'self' else _status(db, actor_id, friend_id),
+        'incoming_status': None if outcome == 'self' else _status(db, friend_id, actor_id),
+    }]
+
+
+def rpc_friend_request_bulk(db, actor_id, friend_emails):
+    results = []
+    for email in friend_emails:
+        row = rpc_friend_request(db, actor_id, email)[0]
+        results.append({'email': email, 'outcome': row['outcome'], 'friend_id': row['friend_id'],
+                        'friend_username': row['friend_username']})
+    return results
+
+
+def rpc_friend_accept(db, actor_id, requester_id):
+    if _status(db, requester_id, actor_id) == 'pending':
+        _set_status(db, requester_id, actor_id, 'accepted')
+        _set_status(db, actor_id, requester_id, 'accepted')
+        outcome = 'accepted'
+    elif _status(db, requester_id, actor_id) == 'accepted':
+        outcome = 'already_friends'
+    else:
+        outcome = 'no_request'
+    return [{'outcome': outcome, 'outgoing_status': _status(db, actor_id, requester_id),
+             'incoming_status': _status(db, requester_id, actor_id)}]
+
+
+def rpc_friend_reject(db, actor_id, requester_id):
+    outcome = 'no_request'
+    if _status(db, requester_id, actor_id) == 'pending':
+        db.delete_rows('friendships', [db.tables['friendships'][(requester_id, actor_id)]])
+        outcome = 'rejected'
+    return [{'outcome': outcome, 'outgoing_status': _status(db, actor_id, requester_id),
+             'incoming_status': _status(db, requester_id, actor_id)}]
+
+
+def rpc_friend_remove(db, actor_id, other_id):
+    rows = [r for k, r in db.tables['friendships'].items() if k in ((actor_id, other_id), (other_id, actor_id))]
+    db.delete_rows('friendships', rows)
+    return [{'outcome': 'removed' if rows else 'not_friends', 'outgoing_status': None, 'incoming_status': None}]
+
+
+def rpc_rate_limit_take(db, p_key, p_capacity, p_rate, p_cost=1):
+    now = time.time()
+    with db.lock:
+        bucket = db.tables['rate_limit_buckets'].setdefault(
+            (p_key,), {'key': p_key, 'tokens': p_capacity, 'updated_at': now}
+        )
+        bucket['tokens'] = min(p_capacity, bucket['tokens'] + (now - bucket['updated_at']) * p_rate)
+        bucket['updated_at'] = now
+        if bucket['tokens'] >= p_cost:
+            bucket['tokens'] -= p_cost
+            return [{'allowed': True, 'retry_after': 0.0}]
+        return [{'allowed': False, 'retry_after': (p_cost - bucket['tokens']) / p_rate}]
+
+
+def rpc_rate_limit_evict(db, idle_seconds=3600):
+    cutoff = time.time() - idle_seconds
+    with db.lock:
+        idle = [k for k, b in db.tables['rate_limit_buckets'].items() if b['updated_at'] < cutoff]
+        for k in idle:
+            del db.tables['rate_limit_buckets'][k]
+    return len(idle)
+
+
+RPC_HANDLERS = {
+    'get_feed': rpc_get_feed,
+    'get_nearby_feed': rpc_get_nearby_feed,
+    'get_place_catalog': rpc_get_place_catalog,
+    'get_user_places': rpc_get_user_places,
+    'archive_expired_checkins': rpc_archive_expired_checkins,
+    'friend_request': rpc_friend_request,
+    'friend_request_bulk': rpc_friend_request_bulk,
+    'friend_accept': rpc_friend_accept,
+    'friend_reject': rpc_friend_reject,
+    'friend_remove': rpc_friend_remove,
+    'rate_limit_take': rpc_rate_limit_take,
+    'rate_limit_evict': rpc_rate_limit_evict,
+}
@@ -0,0 +1,121 @@
+"""
+Synthetic social graph for benchmarks
+Users, friendships, check-ins around real New Haven venues, attendees and notifications,
+written straight into a FakeDatabase (no simulated latency, triggers still run).
+"""
+
+import random
+from datetime import datetime, timedelta
+
+# (name, lat, lng) - downtown venues where check-ins cluster
+VENUES = [
+    ('The Stack', 41.3083, -72.9279),
+    ('Koffee?', 41.3106, -72.9240),
+    ('Blue State Coffee', 41.3114, -72.9300),
+    ('Book Trader Cafe', 41.3078, -72.9305),
+    ('Atticus Bookstore Cafe', 41.3085, -72.9298),
+    ('Pepe\'s Pizzeria', 41.3029, -72.9165),
+    ('Sally\'s Apizza', 41.3021, -72.9173),
+    ('BAR', 41.3057, -72.9264),
+    ('Toad\'s Place', 41.3115, -72.9299),
+    ('Yale University Art Gallery', 41.3083, -72.9310),
+    ('New Haven Green', 41.3080, -72.9255),
+    ('East Rock Park', 41.3295, -72.9066),
+    ('Lighthouse Point Park', 41.2515, -72.9040),
+    ('Caseus', 41.3131, -72.9210),
+    ('Bru Cafe', 41.3117, -72.9283),
+    ('Sterling Memorial Library', 41.3113, -72.9286),
+    ('Shake Shack', 41.3071, -72.9281),
+    ('Tomatillo', 41.3108, -72.9235),
+    ('Ashley\'s Ice Cream', 41.3103, -72.9291),
+    ('Yale Bowl', 41.3133, -72.9604),
+]
+
+
+def iso(dt):
+    return dt.isoformat()
+
+
+def populate(db, users=200, friends_per_user=12, active_checkins=60, history_checkins=2000,
+             attendees_per_checkin=2, notifications_per_user=60, seed=1):
+    """
+    Fill db with a reproducible dataset and return the list of user ids
+    history_checkins are already expired (they feed stats, not the live feed)
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    user_rows = db.insert_rows('users', [
+        {
+            'username': f'user{i}',
+            'email': f'user{i}@example.com',
+            'password_hash': 'not-a-real-hash',
+            'created_at': iso(now - timedelta(days=rng.randint(1, 365))),
+        }
+        for i in range(users)
+    ])
+    user_ids = [u['id'] for u in user_rows]
+
+    # Mostly accepted, symmetric friendships plus a few pending requests
+    pairs = set()
+    for uid in user_ids:
+        for fid in rng.sample(user_ids, min(friends_per_user, users - 1)):
+            if fid != uid:
+                pairs.add(tuple(sorted((uid, fid))))
+    friendship_rows = []
+    for a, b in pairs:
+        if rng.random() < 0.1:
+            friendship_rows.append({'user_id': a, 'friend_id': b, 'status': 'pending'})
+        else:
+            friendship_rows.append({'user_id': a, 'friend_id': b, 'status': 'accepted'})
+            friendship_rows.append({'user_id': b, 'friend_id': a, 'status': 'accepted'})
+    db.insert_rows('friendships', friendship_rows)
+
+    def checkin_row(created, expires):
+        name, lat, lng = rng.choice(VENUES)
+        lat += rng.uniform(-0.0005, 0.0005)
+        lng += rng.uniform(-0.0005, 0.0005)
+        return {
+            'user_id': rng.choice(user_ids),
+            'location_name': name,
+            'geom': f'POINT({lng} {lat})',
+            'message': rng.choice(['', 'Come hang!', 'Grabbing coffee', 'Studying here']),
+            'visibility': 'everyone',
+            'expires_at': iso(expires),
+            'created_at': iso(created),
+        }
+
+    history = []
+    for _ in range(history_checkins):
+        created = now - timedelta(days=rng.uniform(1, 180))
+        history.append(checkin_row(created, created + timedelta(minutes=rng.choice([30, 60, 120]))))
+    active = []
+    for _ in range(active_checkins):
+        created = now - timedelta(minutes=rng.uniform(0, 50))
+        active.append(checkin_row(created, now + timedelta(minutes=rng.uniform(10, 120))))
+    checkin_rows = db.insert_rows('checkins', history + active)
+
+    attendee_rows = []
+    for c in checkin_rows:
+        for uid in rng.sample(user_ids, min(attendees_per_checkin, users)):
+            if uid != c['user_id']:
+                attendee_rows.append({'checkin_id': c['id'], 'user_id': uid, 'status': 'coming'})
+    db.insert_rows('attendees', attendee_rows)
+
+    notification_rows = []
+    for uid in user_ids:
+        for _ in range(notifications_per_user):
+            sender = rng.choice(user_ids)
+            notification_rows.append({
+                'user_id': uid,
+                'sender_id': sender,
+                'type': 'checkin_alert',
+                'title': 'Someone is hanging out!',
+                'body': 'Are you coming?',
+                'related_id': rng.choice(checkin_rows)['id'],
+                'is_read': rng.random() < 0.7,
+                'created_at': iso(now - timedelta(minutes=rng.uniform(0, 60 * 24 * 30))),
+            })
+    db.insert_rows('notifications', notification_rows)
+
+    return user_ids
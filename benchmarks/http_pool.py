@@ -0,0 +1,205 @@
+"""
+Connection pooling benchmark against a local HTTP stub
+Many threads (like gunicorn request threads) send small requests through the PostgREST and FCM
+transports with and without keep-alive pooling, and per-request latency plus the number of
+connections the stub accepted are reported as JSON.
+
+    python -m benchmarks.http_pool --threads 32 --fcm-threads 100 --requests 2000 --connect-ms 20
+
+The stub sleeps --connect-ms on every new connection to stand in for the TCP + TLS handshake
+to Supabase / Google, which is what pooling saves.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.run import git_commit, load_app, percentile
+
+BODY = b'[{"id": 1, "username": "user1"}]'
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, connect_ms, connections):
+        self.connect_ms = connect_ms
+        self.connections = connections  # multiprocessing.Value shared with the benchmark process
+        super().__init__(('127.0.0.1', 0), StubHandler)
+
+
+def serve_stub(connect_ms, connections, port):
+    """Run the stub in its own process so it doesn't compete with the client threads for the GIL"""
+    server = StubServer(connect_ms, connections)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive unless the client closes
+    disable_nagle_algorithm = True  # headers are written piecemeal; avoid 40 ms delayed-ACK stalls
+
+    def setup(self):
+        super().setup()
+        with self.server.connections.get_lock():
+            self.server.connections.value += 1
+        time.sleep(self.server.connect_ms / 1000)
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    do_GET = do_POST = do_PATCH = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def postgrest_client(hangouts, base_url, mode):
+    """A postgrest client whose session is built the way get_supabase() builds it (or not pooled)"""
+    import httpx
+    from postgrest import SyncPostgrestClient
+    from postgrest.utils import SyncClient
+
+    client = SyncPostgrestClient(f'{base_url}/rest/v1')
+    if mode == 'default':
+        return client  # postgrest's own httpx session (httpx default limits)
+    if mode == 'pooled':
+        transport = hangouts.build_http_transport(f'bench-{mode}')
+    else:
+        transport = httpx.HTTPTransport(limits=httpx.Limits(max_keepalive_connections=0))
+    default_session = client.session
+    client.session = SyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=hangouts.http_timeout(),
+        transport=transport,
+        follow_redirects=True,
+    )
+    default_session.close()
+    return client
+
+
+def fcm_sender(hangouts, url, mode):
+    """
+    POST function for one FCM-like transport: a fresh session per send, a requests session as
+    firebase_admin sets it up (default adapter) or one with the app's pooled adapter
+    """
+    import requests
+
+    if mode == 'no-keepalive':
+        def send():
+            with requests.Session() as session:
+                return session.post(url, json={'message': {}}).json()
+        return send, lambda: None
+
+    session = requests.Session()
+    if mode == 'pooled':
+        session.mount('http://', hangouts.build_fcm_adapter(f'bench-{mode}'))
+    return lambda: session.post(url, json={'message': {}}).json(), session.close
+
+
+def run_mode(connections, threads, requests, call):
+    with connections.get_lock():
+        connections.value = 0
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        call()
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': requests,
+        'connections_opened': connections.value,
+        'throughput_rps': round(requests / wall, 1),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP connection pooling benchmark')
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--fcm-threads', type=int, default=100,
+                        help='Concurrent FCM sends (send_each uses one thread per message in a batch)')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per transport and mode')
+    parser.add_argument('--connect-ms', type=float, default=20.0, help='Simulated handshake per new connection')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        hangouts = load_app()
+        connections, port = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+        stub = multiprocessing.Process(target=serve_stub, args=(args.connect_ms, connections, port), daemon=True)
+        stub.start()
+        while not port.value:
+            time.sleep(0.01)
+        url = f'http://127.0.0.1:{port.value}'
+
+        results = {'postgrest': {}, 'fcm': {}}
+        try:
+            for mode in ('no-keepalive', 'default', 'pooled'):
+                client = postgrest_client(hangouts, url, mode)
+                query = lambda: client.from_('checkins').select('id, username').eq('user_id', 'u1').limit(20).execute()
+                results['postgrest'][mode] = run_mode(connections, args.threads, args.requests, query)
+                client.session.close()
+
+                send, close = fcm_sender(hangouts, f'{url}/v1/projects/bench/messages:send', mode)
+                results['fcm'][mode] = run_mode(connections, args.fcm_threads, args.requests, send)
+                close()
+        finally:
+            stub.terminate()
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'params': {k: v for k, v in vars(args).items() if k != 'output'},
+                'pool': {
+                    'http_pool_size': hangouts.HTTP_POOL_SIZE,
+                    'fcm_pool_size': hangouts.FCM_POOL_SIZE,
+                    'http2': hangouts.http2_enabled(),
+                },
+            },
+            'results': results,
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
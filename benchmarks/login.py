@@ -0,0 +1,131 @@
+"""
+Login throughput benchmark
+N concurrent users log in (real password hashes, in-memory Supabase stand-in) while one client
+keeps polling the feed, once with hashing inline on the request threads and once with the
+process pool. Reports logins per second, login latency and the feed latency during the burst.
+
+    python -m benchmarks.login --concurrency 16 --logins 200 --workers 2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.generate import populate
+from benchmarks.run import Bench, git_commit, load_app, percentile
+
+PASSWORD = 'benchmark-password'
+
+
+def latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p90': round(percentile(values, 90), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def run_mode(hangouts, bench, emails, concurrency, logins):
+    feed_latencies = []
+    login_latencies = []
+    errors = 0
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def poll_feed():
+        while not done.is_set():
+            feed_latencies.append(bench.feed()['ms'])
+
+    def login(i):
+        nonlocal errors
+        client = hangouts.app.test_client()
+        start = time.perf_counter()
+        response = client.post('/api/login', json={'email': emails[i % len(emails)], 'password': PASSWORD})
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            login_latencies.append(elapsed)
+            errors += response.status_code != 200
+
+    poller = threading.Thread(target=poll_feed)
+    poller.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(login, range(logins)))
+    wall = time.perf_counter() - start
+    done.set()
+    poller.join()
+
+    return {
+        'logins': logins,
+        'errors': errors,
+        'logins_per_second': round(logins / wall, 2),
+        'login_latency_ms': latency_summary(login_latencies),
+        'feed_requests_during_burst': len(feed_latencies),
+        'feed_latency_ms': latency_summary(feed_latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Login throughput benchmark')
+    parser.add_argument('--concurrency', type=int, default=16, help='Users logging in at once')
+    parser.add_argument('--logins', type=int, default=200, help='Logins per mode')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Hash pool processes')
+    parser.add_argument('--method', help='Werkzeug hash method (default: the app\'s PASSWORD_HASH_METHOD)')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='Simulated latency per database call')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        hangouts = load_app()
+        method = args.method or hangouts.password_hasher.method
+        fake = FakeSupabase(latency_ms=args.latency_ms)
+        user_ids = populate(fake.db, users=100, history_checkins=200, notifications_per_user=5)
+        # One real hash shared by every user - hashing is what's measured, not the data set
+        password_hash = hangouts.PasswordHasher(method, workers=0).hash(PASSWORD)
+        for row in fake.db.tables['users'].values():
+            row['password_hash'] = password_hash
+        emails = [row['email'] for row in fake.db.tables['users'].values()]
+        hangouts.supabase = hangouts.InstrumentedClient(fake)
+        bench = Bench(hangouts, fake, user_ids, random.Random(1))
+
+        results = {}
+        # inline: every request thread hashes at once, as before the pool existed
+        for mode, workers, max_pending in (('inline', 0, args.concurrency), ('pool', args.workers, None)):
+            hangouts.password_hasher = hangouts.PasswordHasher(method, workers=workers, max_pending=max_pending, timeout=60)
+            hangouts.password_hasher.verify(password_hash, PASSWORD)  # start the pool outside the timing
+            results[mode] = run_mode(hangouts, bench, emails, args.concurrency, args.logins)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'params': dict({k: v for k, v in vars(args).items() if k != 'output'}, method=method),
+            },
+            'results': results,
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
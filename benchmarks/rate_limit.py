@@ -0,0 +1,107 @@
+"""
+Hot-path overhead of the rate limiter
+Times MemoryRateLimitBackend.take for one hot key and for keys spread over a large key space,
+the full per-request check (building the user/IP keys inside a request context, two buckets),
+and the memory held per active key.
+
+    python -m benchmarks.rate_limit --iterations 200000 --keys 100000 --budget-us 8
+
+Exits with code 1 if the per-request check costs more than --budget-us microseconds.
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.run import git_commit, load_app
+
+# Large enough that nothing is ever rejected - the allowed path is the one every request pays for
+UNLIMITED = (1e12, 1e12)
+
+
+def time_per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rate limiter overhead benchmark')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=100000, help='Distinct keys for the spread-out run')
+    parser.add_argument('--budget-us', type=float, default=8.0, help='Fail above this per-request overhead')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        hangouts = load_app()
+        rng = random.Random(1)
+        capacity, rate = UNLIMITED
+
+        backend = hangouts.MemoryRateLimitBackend(max_keys=args.keys)
+        hot_us = time_per_call(lambda: backend.take('checkin:user:hot', capacity, rate), args.iterations)
+
+        keys = [f'checkin:user:{i}' for i in range(args.keys)]
+        picks = [rng.choice(keys) for _ in range(args.iterations)]
+        backend = hangouts.MemoryRateLimitBackend(max_keys=args.keys)
+        picks_iter = iter(picks)
+        spread_us = time_per_call(lambda: backend.take(next(picks_iter), capacity, rate), args.iterations)
+
+        tracemalloc.start()
+        backend = hangouts.MemoryRateLimitBackend(max_keys=args.keys)
+        before = tracemalloc.get_traced_memory()[0]
+        for key in keys:
+            backend.take(key, capacity, rate)
+        bytes_per_key = (tracemalloc.get_traced_memory()[0] - before) / len(keys)
+        tracemalloc.stop()
+
+        limiter = hangouts.RateLimiter(
+            hangouts.MemoryRateLimitBackend(), {'checkin': {'user': UNLIMITED, 'ip': UNLIMITED}}
+        )
+        with hangouts.app.test_request_context(
+            '/api/checkin', method='POST', json={'user_id': 'benchmark-user'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}
+        ):
+            request_us = time_per_call(
+                lambda: limiter.check('checkin', hangouts.rate_limit_subjects()), args.iterations
+            )
+            subjects_us = time_per_call(hangouts.rate_limit_subjects, args.iterations)
+
+        results = {
+            'take_hot_key_us': round(hot_us, 3),
+            'take_spread_keys_us': round(spread_us, 3),
+            'bytes_per_active_key': round(bytes_per_key, 1),
+            'request_check_us': round(request_us, 3),
+            'request_subjects_us': round(subjects_us, 3),
+        }
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'params': {k: v for k, v in vars(args).items() if k != 'output'},
+            },
+            'results': results,
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if request_us > args.budget_us:
+        print(f'FAIL: rate limit check costs {request_us:.2f} us per request (budget {args.budget_us} us)',
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
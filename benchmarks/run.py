@@ -0,0 +1,267 @@
+"""
+Drive the main API routes through the Flask test client against the in-memory Supabase
+stand-in and report latency percentiles and database round trips per request as JSON.
+
+    python -m benchmarks.run --users 500 --latency-ms 5 --output bench.json
+
+Response sizes are reported as sent (after compression), and a feed_encoding block compares
+feed payload encode time and size for the full, sparse and compact wire formats.
+Diff two runs (e.g. before/after a change) to compare routes between commits. The app's own
+logging goes to stderr, so stdout carries only the JSON report and can be piped or redirected.
+"""
+
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.generate import VENUES, populate
+
+
+def load_app():
+    """Import app.py with placeholder credentials; the real client is swapped out by the caller"""
+    os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    os.environ.setdefault('SUPABASE_KEY', 'benchmark.placeholder.key')
+    os.environ.setdefault('PUSH_WORKERS', '0')
+    # Every simulated user shares the test client's IP, which would trip the per-IP limits
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as hangouts
+    return hangouts
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    latencies = sorted(s['ms'] for s in samples)
+    trips = [s['round_trips'] for s in samples]
+    sizes = [s['bytes'] for s in samples]
+    by_target = {}
+    for s in samples:
+        for target, n in s['targets'].items():
+            by_target[target] = by_target.get(target, 0) + n
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s['status'] >= 400),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'round_trips': {
+            'mean': round(sum(trips) / len(trips), 2),
+            'max': max(trips),
+        },
+        'round_trips_by_target': {k: round(v / len(samples), 2) for k, v in sorted(by_target.items())},
+        'response_bytes': {
+            'mean': round(sum(sizes) / len(sizes)),
+            'max': max(sizes),
+        },
+    }
+
+
+class Bench:
+    def __init__(self, hangouts, fake, user_ids, rng):
+        self.app = hangouts.app
+        self.fake = fake
+        self.user_ids = user_ids
+        self.rng = rng
+        self._clients = {}
+
+    def client_for(self, user_id):
+        """Test client with a Flask-Login session for user_id"""
+        client = self._clients.get(user_id)
+        if client is None:
+            client = self.app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = user_id
+                sess['_fresh'] = True
+            self._clients[user_id] = client
+        return client
+
+    def measure(self, call):
+        before = dict(self.fake.calls_by_target)
+        start = time.perf_counter()
+        response = call()
+        elapsed = (time.perf_counter() - start) * 1000
+        after = self.fake.calls_by_target
+        targets = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+        return {
+            'ms': elapsed,
+            'status': response.status_code,
+            'round_trips': sum(targets.values()),
+            'targets': targets,
+            'bytes': len(response.get_data()),
+        }
+
+    def active_checkin_ids(self):
+        now = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())
+        return [c['id'] for c in self.fake.db.tables['checkins'].values() if c['expires_at'].rstrip('Z') > now]
+
+    # --- scenarios ---
+
+    def feed(self, query='', headers=None):
+        uid = self.rng.choice(self.user_ids)
+        return self.measure(lambda: self.client_for(uid).get(f'/api/feed?user_id={uid}{query}', headers=headers))
+
+    def feed_fields(self):
+        return self.feed(f'&fields={MAP_PIN_FIELDS}')
+
+    def feed_compact(self):
+        return self.feed('&format=compact')
+
+    def feed_compressed(self):
+        return self.feed(headers={'Accept-Encoding': 'br, gzip'})
+
+    def feed_clusters(self):
+        uid = self.rng.choice(self.user_ids)
+        zoom = self.rng.choice((12, 13, 14, 15, 16))
+        return self.measure(lambda: self.client_for(uid).get(f'/api/feed/clusters?user_id={uid}&zoom={zoom}'))
+
+    def checkin(self):
+        uid = self.rng.choice(self.user_ids)
+        name, lat, lng = self.rng.choice(VENUES)
+        payload = {
+            'user_id': uid,
+            'lat': lat,
+            'lng': lng,
+            'location_name': name,
+            'message': 'Benchmark hang',
+            'duration_minutes': 60,
+        }
+        return self.measure(lambda: self.client_for(uid).post('/api/checkin', json=payload))
+
+    def stats(self):
+        uid = self.rng.choice(self.user_ids)
+        return self.measure(lambda: self.client_for(uid).get('/api/stats/user'))
+
+    def notifications(self):
+        uid = self.rng.choice(self.user_ids)
+        return self.measure(lambda: self.client_for(uid).get('/api/notifications'))
+
+    def coming(self):
+        uid = self.rng.choice(self.user_ids)
+        checkin_id = self.rng.choice(self.active_checkin_ids())
+        payload = {'user_id': uid, 'checkin_id': checkin_id}
+        return self.measure(lambda: self.client_for(uid).post('/api/coming', json=payload))
+
+
+# What a map view needs to draw pins
+MAP_PIN_FIELDS = 'username,location_name,lat,lng,expires_at'
+
+SCENARIOS = ['feed', 'feed_fields', 'feed_compact', 'feed_compressed', 'feed_clusters', 'checkin', 'stats', 'notifications', 'coming']
+
+
+def encode_ms(encode, payload, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(payload)
+    return round((time.perf_counter() - start) / iterations * 1000, 4)
+
+
+def feed_encoding(hangouts, bench, iterations):
+    """
+    Encode time and size of the largest feed among the users, per wire format:
+    standard library json (Flask's default provider) vs the app's JSON provider, and gzip/brotli sizes
+    """
+    sizes = {uid: len(bench.client_for(uid).get(f'/api/feed?user_id={uid}').get_data()) for uid in bench.user_ids}
+    uid = max(sizes, key=sizes.get)
+    variants = {'full': '', 'fields': f'&fields={MAP_PIN_FIELDS}', 'compact': '&format=compact'}
+    stdlib = lambda payload: json.dumps(payload, separators=(',', ':'))
+    report = {'checkins': None, 'encoder': 'orjson' if hangouts.orjson is not None else 'json'}
+    for name, query in variants.items():
+        payload = bench.client_for(uid).get(f'/api/feed?user_id={uid}{query}').get_json()
+        report['checkins'] = len(payload['checkins'])
+        body = hangouts.app.json.dumps(payload).encode()
+        report[name] = {
+            'bytes': len(body),
+            'gzip_bytes': len(gzip.compress(body, compresslevel=hangouts.COMPRESS_GZIP_LEVEL)),
+            'br_bytes': len(hangouts.compress_body(body, 'br')) if hangouts.brotli is not None else None,
+            'encode_ms_stdlib': encode_ms(stdlib, payload, iterations),
+            'encode_ms_provider': encode_ms(hangouts.app.json.dumps, payload, iterations),
+        }
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks for app.py')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--friends-per-user', type=int, default=12)
+    parser.add_argument('--active-checkins', type=int, default=60)
+    parser.add_argument('--history-checkins', type=int, default=2000)
+    parser.add_argument('--notifications-per-user', type=int, default=60)
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='Unrecorded requests per scenario')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='Simulated latency per database call')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Run only these (repeatable)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        hangouts = load_app()
+        fake = FakeSupabase(latency_ms=args.latency_ms)
+        user_ids = populate(
+            fake.db,
+            users=args.users,
+            friends_per_user=args.friends_per_user,
+            active_checkins=args.active_checkins,
+            history_checkins=args.history_checkins,
+            notifications_per_user=args.notifications_per_user,
+            seed=args.seed,
+        )
+        # Keep the app's own instrumentation in the loop so its overhead is measured too
+        hangouts.supabase = hangouts.InstrumentedClient(fake)
+
+        bench = Bench(hangouts, fake, user_ids, random.Random(args.seed))
+        results = {}
+        for name in args.scenario or SCENARIOS:
+            scenario = getattr(bench, name)
+            for _ in range(args.warmup):
+                scenario()
+            results[name] = summarize([scenario() for _ in range(args.iterations)])
+        results['feed_encoding'] = feed_encoding(hangouts, bench, args.iterations)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'params': {k: v for k, v in vars(args).items() if k != 'output'},
+            },
+            'results': results,
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
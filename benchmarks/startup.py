@@ -0,0 +1,173 @@
+"""
+Cold-start benchmark and import-time profile for app.py
+
+    python -m benchmarks.startup --output startup.json          # cold starts: import + first GET /about
+    python -m benchmarks.startup --baseline startup.json        # ...and fail if slower than a saved run
+    python -m benchmarks.startup --profile                      # per-package import-time breakdown
+    python -m benchmarks.startup --profile --by module --top 40
+
+Every sample is a fresh interpreter, like a serverless cold start. The run fails (exit code 1)
+if serving /about imports any of the DEFERRED modules, or if the median cold start is more than
+--tolerance slower than the --baseline run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies app.py only imports on first use; a cold /about must not pull them in
+DEFERRED = ('supabase', 'postgrest', 'gotrue', 'httpx', 'firebase_admin', 'google', 'flask_mail', 'certifi', 'numpy')
+
+CHILD = '''
+import json, sys, time
+preloaded = set(sys.modules)
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/about')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': response.status_code,
+    'deferred_loaded': sorted({m.split('.')[0] for m in set(sys.modules) - preloaded} & set(%r)),
+}))
+''' % (DEFERRED,)
+
+
+def child_env():
+    """Placeholder credentials, as in benchmarks.run - nothing here talks to a real backend"""
+    env = dict(os.environ)
+    env.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    env.setdefault('SUPABASE_KEY', 'benchmark.placeholder.key')
+    env.setdefault('PUSH_WORKERS', '0')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def cold_start():
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=ROOT, env=child_env(),
+        capture_output=True, text=True, check=True
+    ).stdout
+    # app.py prints during startup; the measurement is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    summary = {}
+    for key in ('import_ms', 'first_request_ms', 'total_ms'):
+        values = sorted(s[key] for s in samples)
+        summary[key] = {
+            'median': round(statistics.median(values), 2),
+            'min': round(values[0], 2),
+            'max': round(values[-1], 2),
+        }
+    return summary
+
+
+def import_profile():
+    """Parse `python -X importtime` into [(module, self_us, cumulative_us)] for `import app`"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=child_env(),
+        capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def print_profile(rows, by, top):
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+    if by == 'package':
+        packages = {}
+        for module, self_us, _ in rows:
+            entry = packages.setdefault(module.split('.')[0], [0, 0])
+            entry[0] += self_us
+            entry[1] += 1
+        table = sorted(((name, us, n) for name, (us, n) in packages.items()), key=lambda r: -r[1])
+        print(f'{"package":<32} {"self ms":>9} {"share":>7} {"modules":>8}')
+        for name, us, n in table[:top]:
+            print(f'{name:<32} {us / 1000:>9.1f} {us / 10 / total_ms:>6.1f}% {n:>8}')
+    else:
+        print(f'{"module":<48} {"self ms":>9} {"cumulative ms":>14}')
+        for module, self_us, cumulative_us in sorted(rows, key=lambda r: -r[1])[:top]:
+            print(f'{module:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}')
+    print(f'\n{len(rows)} modules, {total_ms:.1f} ms total import time')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold-start benchmark for app.py')
+    parser.add_argument('--runs', type=int, default=7, help='Fresh interpreters to sample')
+    parser.add_argument('--baseline', help='JSON from a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown of the median cold start vs --baseline (0.25 = 25%%)')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    parser.add_argument('--profile', action='store_true', help='Print an import-time breakdown instead')
+    parser.add_argument('--by', choices=['package', 'module'], default='package')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print_profile(import_profile(), args.by, args.top)
+        return 0
+
+    samples = []
+    for _ in range(args.runs):
+        sample = cold_start()
+        sample['total_ms'] = sample['import_ms'] + sample['first_request_ms']
+        samples.append(sample)
+
+    failures = []
+    loaded = sorted({m for s in samples for m in s['deferred_loaded']})
+    if loaded:
+        failures.append(f'serving /about imported deferred modules: {", ".join(loaded)}')
+    if any(s['status'] != 200 for s in samples):
+        failures.append('GET /about did not return 200')
+
+    results = summarize(samples)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']['total_ms']['median']
+        limit = baseline * (1 + args.tolerance)
+        if results['total_ms']['median'] > limit:
+            failures.append(
+                f'median cold start {results["total_ms"]["median"]} ms exceeds baseline '
+                f'{baseline} ms + {args.tolerance:.0%}'
+            )
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'params': {'runs': args.runs},
+        },
+        'results': results,
+        'deferred_loaded': loaded,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+-- Migration: Archive expired check-ins
+-- Run this in Supabase SQL Editor (after migration_stats_rollups.sql and migration_place_catalog.sql)
+--
+-- Expired check-ins are moved out of the hot checkins table by the sweeper
+-- (`flask sweep-checkins` or the /api/cron/sweep Vercel cron), so feed and nearby queries
+-- only ever scan live rows plus at most one sweep interval of expired ones.
+-- Called from app.py via: supabase.rpc('archive_expired_checkins', {...})
+
+-- 1. Archive table: the check-in row plus its attendees, frozen at archive time
+CREATE TABLE IF NOT EXISTS checkins_archive (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    location_name TEXT NOT NULL,
+    geom GEOMETRY(POINT, 4326) NOT NULL,
+    message TEXT,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP,
+    visibility TEXT,
+    share_with UUID[],
+    attendees JSONB NOT NULL DEFAULT '[]'::jsonb,
+    archived_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now())
+);
+
+CREATE INDEX IF NOT EXISTS idx_checkins_archive_user_created_at ON checkins_archive(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_checkins_archive_location_name ON checkins_archive(location_name);
+
+ALTER TABLE checkins_archive ENABLE ROW LEVEL SECURITY;
+
+-- 2. Archiving is not "un-checking-in": keep the all-time stats rollups untouched
+CREATE OR REPLACE FUNCTION checkins_stats_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF current_setting('hangouts.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM bump_checkin_stats(OLD.user_id, OLD.location_name, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_checkin_stats(NEW.user_id, NEW.location_name, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- 3. Move one bounded batch; returns the number of check-ins archived
+CREATE OR REPLACE FUNCTION archive_expired_checkins(batch_size INT DEFAULT 500, grace_minutes INT DEFAULT 60)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    moved INT;
+BEGIN
+    PERFORM set_config('hangouts.archiving', 'on', true);
+
+    WITH batch AS (
+        SELECT c.id
+        FROM checkins c
+        WHERE c.expires_at < timezone('utc', now()) - make_interval(mins => grace_minutes)
+        ORDER BY c.expires_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    archived AS (
+        INSERT INTO checkins_archive (
+            id, user_id, location_name, geom, message, expires_at, created_at, visibility, share_with, attendees
+        )
+        SELECT
+            c.id, c.user_id, c.location_name, c.geom, c.message, c.expires_at, c.created_at,
+            c.visibility, c.share_with,
+            COALESCE((
+                SELECT jsonb_agg(jsonb_build_object('user_id', a.user_id, 'status', a.status, 'created_at', a.created_at))
+                FROM attendees a
+                WHERE a.checkin_id = c.id
+            ), '[]'::jsonb)
+        FROM checkins c
+        JOIN batch b ON b.id = c.id
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    ),
+    deleted AS (
+        -- Attendees go with the check-in via ON DELETE CASCADE
+        DELETE FROM checkins c
+        USING batch b
+        WHERE c.id = b.id
+        RETURNING c.id
+    )
+    SELECT COUNT(*) INTO moved FROM deleted;
+
+    PERFORM set_config('hangouts.archiving', 'off', true);
+    RETURN moved;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION archive_expired_checkins(INT, INT) TO service_role;
+
+-- 4. Place catalog keeps archived venues, so autocomplete still knows past favourites
+CREATE OR REPLACE FUNCTION get_place_catalog()
+RETURNS TABLE (
+    location_name TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.location_name,
+        AVG(ST_Y(c.geom)) AS lat,
+        AVG(ST_X(c.geom)) AS lng,
+        COUNT(*) AS count
+    FROM (
+        SELECT location_name, geom FROM checkins
+        UNION ALL
+        SELECT location_name, geom FROM checkins_archive
+    ) c
+    WHERE c.location_name IS NOT NULL
+      AND c.location_name NOT IN ('Unknown Location', 'Current Location')
+    GROUP BY c.location_name;
+$$;
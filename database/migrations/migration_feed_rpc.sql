@@ -0,0 +1,70 @@
+-- Migration: Server-side feed query
+-- Run this in Supabase SQL Editor
+--
+-- Moves the friend join, expiry filter and visibility (share_with) check for /api/feed
+-- into a single statement, so private check-ins never leave the database.
+-- Called from app.py via: supabase.rpc('get_feed', {'viewer_id': user_id})
+
+-- 1. GIN index so "viewer_id = ANY(share_with)" lookups can use the array containment operator
+CREATE INDEX IF NOT EXISTS idx_checkins_share_with ON checkins USING GIN(share_with);
+
+-- 2. Composite index for "active check-ins by these users"
+CREATE INDEX IF NOT EXISTS idx_checkins_user_id_expires_at ON checkins(user_id, expires_at);
+
+-- 3. Feed function: returns only the columns the client renders
+CREATE OR REPLACE FUNCTION get_feed(viewer_id UUID)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    username TEXT,
+    location_name TEXT,
+    message TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP,
+    visibility TEXT,
+    attendees JSONB
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.id,
+        c.user_id,
+        u.username,
+        c.location_name,
+        c.message,
+        ST_Y(c.geom) AS lat,
+        ST_X(c.geom) AS lng,
+        c.expires_at,
+        c.created_at,
+        COALESCE(c.visibility, 'everyone') AS visibility,
+        COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('user_id', a.user_id, 'username', au.username))
+            FROM attendees a
+            JOIN users au ON au.id = a.user_id
+            WHERE a.checkin_id = c.id
+        ), '[]'::jsonb) AS attendees
+    FROM checkins c
+    JOIN users u ON u.id = c.user_id
+    WHERE c.expires_at > timezone('utc', now())
+      AND (
+            -- My own check-ins: always visible
+            c.user_id = viewer_id
+            -- Friends' check-ins: visible to everyone, or explicitly shared with me
+            OR (
+                c.user_id IN (
+                    SELECT f.friend_id FROM friendships f
+                    WHERE f.user_id = viewer_id AND f.status = 'accepted'
+                )
+                AND (
+                    c.visibility IS DISTINCT FROM 'specific'
+                    OR c.share_with @> ARRAY[viewer_id]
+                )
+            )
+      )
+    ORDER BY c.created_at DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_feed(UUID) TO anon, authenticated, service_role;
@@ -0,0 +1,176 @@
+-- Migration: Atomic friendship transitions
+-- Run this in Supabase SQL Editor
+--
+-- Each friend action (request, accept, reject, unfriend) checks the current state and writes
+-- both directions in one transaction, so a failure can no longer leave a half-accepted
+-- friendship, and the app needs a single round trip per click.
+-- Every function returns the outcome plus the final status of both directions
+-- (outgoing = actor -> other, incoming = other -> actor; NULL when the row doesn't exist).
+-- Called from app.py via: supabase.rpc('friend_request', {...}) etc.
+
+-- Serialize concurrent actions on the same pair of users, whichever side starts them
+CREATE OR REPLACE FUNCTION lock_friend_pair(a UUID, b UUID)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    SELECT pg_advisory_xact_lock(hashtext(LEAST(a, b)::text || GREATEST(a, b)::text));
+$$;
+
+-- 1. Send a request by email (accepts instead if they already asked us)
+CREATE OR REPLACE FUNCTION friend_request(actor_id UUID, friend_email TEXT)
+RETURNS TABLE (outcome TEXT, friend_id UUID, friend_username TEXT, outgoing_status TEXT, incoming_status TEXT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    target users%ROWTYPE;
+    v_out TEXT;
+    v_in TEXT;
+    v_outcome TEXT;
+BEGIN
+    SELECT * INTO target FROM users WHERE email = friend_email;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::TEXT, NULL::UUID, NULL::TEXT, NULL::TEXT, NULL::TEXT;
+        RETURN;
+    END IF;
+    IF target.id = actor_id THEN
+        RETURN QUERY SELECT 'self'::TEXT, target.id, target.username, NULL::TEXT, NULL::TEXT;
+        RETURN;
+    END IF;
+
+    PERFORM lock_friend_pair(actor_id, target.id);
+    SELECT f.status INTO v_out FROM friendships f WHERE f.user_id = actor_id AND f.friend_id = target.id;
+    SELECT f.status INTO v_in FROM friendships f WHERE f.user_id = target.id AND f.friend_id = actor_id;
+
+    IF v_out = 'accepted' THEN
+        v_outcome := 'already_friends';
+    ELSIF v_out = 'pending' THEN
+        v_outcome := 'already_pending';
+    ELSIF v_in = 'pending' THEN
+        UPDATE friendships SET status = 'accepted' WHERE user_id = target.id AND friend_id = actor_id;
+        INSERT INTO friendships (user_id, friend_id, status) VALUES (actor_id, target.id, 'accepted')
+        ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'accepted';
+        v_outcome := 'accepted';
+    ELSE
+        INSERT INTO friendships (user_id, friend_id, status) VALUES (actor_id, target.id, 'pending')
+        ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'pending';
+        v_outcome := 'requested';
+    END IF;
+
+    RETURN QUERY
+    SELECT v_outcome, target.id, target.username,
+        (SELECT f.status FROM friendships f WHERE f.user_id = actor_id AND f.friend_id = target.id),
+        (SELECT f.status FROM friendships f WHERE f.user_id = target.id AND f.friend_id = actor_id);
+END;
+$$;
+
+-- 2. Accept a pending request from requester_id
+CREATE OR REPLACE FUNCTION friend_accept(actor_id UUID, requester_id UUID)
+RETURNS TABLE (outcome TEXT, outgoing_status TEXT, incoming_status TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_outcome TEXT;
+BEGIN
+    PERFORM lock_friend_pair(actor_id, requester_id);
+
+    UPDATE friendships SET status = 'accepted'
+    WHERE user_id = requester_id AND friend_id = actor_id AND status = 'pending';
+
+    IF FOUND THEN
+        INSERT INTO friendships (user_id, friend_id, status) VALUES (actor_id, requester_id, 'accepted')
+        ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'accepted';
+        v_outcome := 'accepted';
+    ELSIF EXISTS (
+        SELECT 1 FROM friendships f
+        WHERE f.user_id = requester_id AND f.friend_id = actor_id AND f.status = 'accepted'
+    ) THEN
+        v_outcome := 'already_friends';
+    ELSE
+        v_outcome := 'no_request';
+    END IF;
+
+    RETURN QUERY
+    SELECT v_outcome,
+        (SELECT f.status FROM friendships f WHERE f.user_id = actor_id AND f.friend_id = requester_id),
+        (SELECT f.status FROM friendships f WHERE f.user_id = requester_id AND f.friend_id = actor_id);
+END;
+$$;
+
+-- 3. Reject (delete) a pending request from requester_id
+CREATE OR REPLACE FUNCTION friend_reject(actor_id UUID, requester_id UUID)
+RETURNS TABLE (outcome TEXT, outgoing_status TEXT, incoming_status TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_outcome TEXT;
+BEGIN
+    PERFORM lock_friend_pair(actor_id, requester_id);
+
+    DELETE FROM friendships
+    WHERE user_id = requester_id AND friend_id = actor_id AND status = 'pending';
+    v_outcome := CASE WHEN FOUND THEN 'rejected' ELSE 'no_request' END;
+
+    RETURN QUERY
+    SELECT v_outcome,
+        (SELECT f.status FROM friendships f WHERE f.user_id = actor_id AND f.friend_id = requester_id),
+        (SELECT f.status FROM friendships f WHERE f.user_id = requester_id AND f.friend_id = actor_id);
+END;
+$$;
+
+-- 4. Unfriend: remove both directions
+CREATE OR REPLACE FUNCTION friend_remove(actor_id UUID, other_id UUID)
+RETURNS TABLE (outcome TEXT, outgoing_status TEXT, incoming_status TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    removed INT;
+BEGIN
+    PERFORM lock_friend_pair(actor_id, other_id);
+
+    DELETE FROM friendships
+    WHERE (user_id = actor_id AND friend_id = other_id)
+       OR (user_id = other_id AND friend_id = actor_id);
+    GET DIAGNOSTICS removed = ROW_COUNT;
+
+    RETURN QUERY
+    SELECT CASE WHEN removed > 0 THEN 'removed' ELSE 'not_friends' END, NULL::TEXT, NULL::TEXT;
+END;
+$$;
+
+-- 5. Send requests to several emails at once (/api/friends/add-bulk), same rules as friend_request.
+-- Every pair lock is taken up front in one fixed order, so two overlapping bulk calls (or a bulk
+-- call and a single action) can't deadlock; the whole batch is one transaction.
+CREATE OR REPLACE FUNCTION friend_request_bulk(actor_id UUID, friend_emails TEXT[])
+RETURNS TABLE (email TEXT, outcome TEXT, friend_id UUID, friend_username TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_email TEXT;
+    v_other UUID;
+    r RECORD;
+BEGIN
+    FOR v_other IN
+        SELECT u.id FROM users u
+        WHERE u.email = ANY(friend_emails) AND u.id <> actor_id
+        ORDER BY hashtext(LEAST(actor_id, u.id)::text || GREATEST(actor_id, u.id)::text), u.id
+    LOOP
+        PERFORM lock_friend_pair(actor_id, v_other);
+    END LOOP;
+
+    FOREACH v_email IN ARRAY friend_emails LOOP
+        SELECT * INTO r FROM friend_request(actor_id, v_email);
+        email := v_email;
+        outcome := r.outcome;
+        friend_id := r.friend_id;
+        friend_username := r.friend_username;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION friend_request(UUID, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION friend_accept(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION friend_reject(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION friend_remove(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION friend_request_bulk(UUID, TEXT[]) TO service_role;
@@ -0,0 +1,94 @@
+-- Migration: Spatial feed queries for /api/nearby
+-- Run this in Supabase SQL Editor
+--
+-- Same visibility rules as get_feed (migration_feed_rpc.sql), restricted to either a radius
+-- around a point (ST_DWithin) or a map viewport (bounding box), so the spatial index does the work.
+-- Called from app.py via: supabase.rpc('get_nearby_feed', {...})
+
+-- 1. Geography expression index so radius searches in meters are index-assisted
+--    (the bounding-box mode uses the existing idx_checkins_geom GIST index)
+CREATE INDEX IF NOT EXISTS idx_checkins_geog ON checkins USING GIST((geom::geography));
+
+-- 2. Nearby feed function
+--    Radius mode: center_lat, center_lng, radius_m set
+--    Viewport mode: min_lng, min_lat, max_lng, max_lat set (center optional, used for distance)
+CREATE OR REPLACE FUNCTION get_nearby_feed(
+    viewer_id UUID,
+    center_lat DOUBLE PRECISION DEFAULT NULL,
+    center_lng DOUBLE PRECISION DEFAULT NULL,
+    radius_m DOUBLE PRECISION DEFAULT NULL,
+    min_lng DOUBLE PRECISION DEFAULT NULL,
+    min_lat DOUBLE PRECISION DEFAULT NULL,
+    max_lng DOUBLE PRECISION DEFAULT NULL,
+    max_lat DOUBLE PRECISION DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    username TEXT,
+    location_name TEXT,
+    message TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP,
+    visibility TEXT,
+    attendees JSONB,
+    distance_m DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH center AS (
+        SELECT CASE
+            WHEN center_lat IS NOT NULL AND center_lng IS NOT NULL
+            THEN ST_SetSRID(ST_MakePoint(center_lng, center_lat), 4326)::geography
+        END AS point
+    )
+    SELECT
+        c.id,
+        c.user_id,
+        u.username,
+        c.location_name,
+        c.message,
+        ST_Y(c.geom) AS lat,
+        ST_X(c.geom) AS lng,
+        c.expires_at,
+        c.created_at,
+        COALESCE(c.visibility, 'everyone') AS visibility,
+        COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('user_id', a.user_id, 'username', au.username))
+            FROM attendees a
+            JOIN users au ON au.id = a.user_id
+            WHERE a.checkin_id = c.id
+        ), '[]'::jsonb) AS attendees,
+        ST_Distance(c.geom::geography, center.point) AS distance_m
+    FROM checkins c
+    CROSS JOIN center
+    JOIN users u ON u.id = c.user_id
+    WHERE c.expires_at > timezone('utc', now())
+      AND (
+            radius_m IS NULL
+            OR ST_DWithin(c.geom::geography, center.point, radius_m)
+      )
+      AND (
+            min_lng IS NULL
+            OR c.geom && ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+      )
+      AND (
+            c.user_id = viewer_id
+            OR (
+                c.user_id IN (
+                    SELECT f.friend_id FROM friendships f
+                    WHERE f.user_id = viewer_id AND f.status = 'accepted'
+                )
+                AND (
+                    c.visibility IS DISTINCT FROM 'specific'
+                    OR c.share_with @> ARRAY[viewer_id]
+                )
+            )
+      )
+    ORDER BY distance_m ASC NULLS LAST, c.created_at DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_nearby_feed(UUID, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION) TO anon, authenticated, service_role;
@@ -0,0 +1,16 @@
+-- Migration: Keyset pagination and unread counts for notifications
+-- Run this in Supabase SQL Editor
+--
+-- /api/notifications pages on (created_at, id) newest-first, and
+-- /api/notifications/unread-count counts unread rows without transferring them.
+
+-- 1. Composite index matching "WHERE user_id = ? ORDER BY created_at DESC, id DESC"
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_at
+ON notifications(user_id, created_at DESC, id DESC);
+
+-- 2. Partial index so the unread badge count only touches unread rows
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread
+ON notifications(user_id) WHERE is_read = FALSE;
+
+-- 3. The single-column user_id index is now covered by the composite one
+DROP INDEX IF EXISTS idx_notifications_user_id;
@@ -0,0 +1,30 @@
+-- Migration: Place catalog for the local autocomplete index
+-- Run this in Supabase SQL Editor
+--
+-- One row per distinct check-in venue with its average position and popularity.
+-- Called from app.py via: supabase.rpc('get_place_catalog', {}) when (re)building the place index.
+
+CREATE INDEX IF NOT EXISTS idx_checkins_location_name ON checkins(location_name);
+
+CREATE OR REPLACE FUNCTION get_place_catalog()
+RETURNS TABLE (
+    location_name TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.location_name,
+        AVG(ST_Y(c.geom)) AS lat,
+        AVG(ST_X(c.geom)) AS lng,
+        COUNT(*) AS count
+    FROM checkins c
+    WHERE c.location_name IS NOT NULL
+      AND c.location_name NOT IN ('Unknown Location', 'Current Location')
+    GROUP BY c.location_name;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_place_catalog() TO service_role;
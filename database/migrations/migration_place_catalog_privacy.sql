@@ -0,0 +1,71 @@
+-- Migration: Keep private check-ins out of the shared place catalog
+-- Run this in Supabase SQL Editor (after migration_checkins_archive.sql)
+--
+-- The shared autocomplete index is served to every signed-in user, so it only lists venues from
+-- check-ins shared with all friends (not 'specific' ones) that at least min_users different
+-- people have checked in at - a name there never points at one person's whereabouts.
+-- Each user's own venues, private ones included, come from get_user_places and are only
+-- searched for that user.
+-- Called from app.py via: supabase.rpc('get_place_catalog', {...}) and supabase.rpc('get_user_places', {...})
+
+DROP FUNCTION IF EXISTS get_place_catalog();
+
+CREATE OR REPLACE FUNCTION get_place_catalog(min_users INT DEFAULT 3)
+RETURNS TABLE (
+    location_name TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.location_name,
+        AVG(ST_Y(c.geom)) AS lat,
+        AVG(ST_X(c.geom)) AS lng,
+        COUNT(*) AS count
+    FROM (
+        SELECT user_id, location_name, geom, visibility FROM checkins
+        UNION ALL
+        SELECT user_id, location_name, geom, visibility FROM checkins_archive
+    ) c
+    WHERE c.location_name IS NOT NULL
+      AND c.location_name NOT IN ('Unknown Location', 'Current Location')
+      AND c.visibility IS DISTINCT FROM 'specific'
+    GROUP BY c.location_name
+    HAVING COUNT(DISTINCT c.user_id) >= min_users;
+$$;
+
+-- The viewer's own venues (any visibility), most visited first
+CREATE OR REPLACE FUNCTION get_user_places(viewer_id UUID, max_places INT DEFAULT 200)
+RETURNS TABLE (
+    location_name TEXT,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.location_name,
+        AVG(ST_Y(c.geom)) AS lat,
+        AVG(ST_X(c.geom)) AS lng,
+        COUNT(*) AS count
+    FROM (
+        SELECT location_name, geom FROM checkins WHERE user_id = viewer_id
+        UNION ALL
+        SELECT location_name, geom FROM checkins_archive WHERE user_id = viewer_id
+    ) c
+    WHERE c.location_name IS NOT NULL
+      AND c.location_name NOT IN ('Unknown Location', 'Current Location')
+    GROUP BY c.location_name
+    ORDER BY count DESC
+    LIMIT max_places;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_checkins_user_id_location_name ON checkins(user_id, location_name);
+
+GRANT EXECUTE ON FUNCTION get_place_catalog(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION get_user_places(UUID, INT) TO service_role;
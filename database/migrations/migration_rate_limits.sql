@@ -0,0 +1,65 @@
+-- Migration: Shared token buckets for rate limiting
+-- Run this in Supabase SQL Editor
+--
+-- Only needed with RATE_LIMIT_BACKEND=supabase, when several instances must share one limit;
+-- the default in-memory backend keeps buckets per process. The table is UNLOGGED: buckets are
+-- disposable (a crash just refills them) and skipping the WAL keeps the per-request write cheap.
+-- Called from app.py via: supabase.rpc('rate_limit_take', {...}) and supabase.rpc('rate_limit_evict', {...})
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at ON rate_limit_buckets (updated_at);
+
+-- No policies: only the service role (the backend) may read or reset buckets
+ALTER TABLE rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+
+-- Refill the bucket for the time since its last update and take p_cost tokens if there are enough.
+-- The upsert locks the row, so concurrent requests for one key queue up instead of double-spending.
+CREATE OR REPLACE FUNCTION rate_limit_take(
+    p_key TEXT,
+    p_capacity DOUBLE PRECISION,
+    p_rate DOUBLE PRECISION,
+    p_cost DOUBLE PRECISION DEFAULT 1
+)
+RETURNS TABLE (allowed BOOLEAN, retry_after DOUBLE PRECISION)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tokens DOUBLE PRECISION;
+BEGIN
+    INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at)
+    VALUES (p_key, p_capacity, clock_timestamp())
+    ON CONFLICT (key) DO UPDATE
+        SET tokens = LEAST(p_capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * p_rate),
+            updated_at = clock_timestamp()
+    RETURNING b.tokens INTO v_tokens;
+
+    IF v_tokens >= p_cost THEN
+        UPDATE rate_limit_buckets SET tokens = v_tokens - p_cost WHERE key = p_key;
+        RETURN QUERY SELECT TRUE, 0::DOUBLE PRECISION;
+    ELSE
+        RETURN QUERY SELECT FALSE, (p_cost - v_tokens) / p_rate;
+    END IF;
+END;
+$$;
+
+-- Drop buckets untouched for idle_seconds (they would be full again anyway); run by /api/cron/sweep
+CREATE OR REPLACE FUNCTION rate_limit_evict(idle_seconds INTEGER DEFAULT 3600)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_deleted INTEGER;
+BEGIN
+    DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - make_interval(secs => idle_seconds);
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION rate_limit_take(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION) TO service_role;
+GRANT EXECUTE ON FUNCTION rate_limit_evict(INTEGER) TO service_role;
@@ -0,0 +1,90 @@
+-- Migration: Precomputed stats rollups
+-- Run this in Supabase SQL Editor
+--
+-- /api/stats/user used to pull up to 3000 raw check-in rows per request and count them in Python,
+-- which also went wrong once the table outgrew the limit. These tables hold exact counts that a
+-- trigger keeps up to date on every check-in insert, delete or move, so the endpoint is a few
+-- indexed lookups at any table size.
+
+-- 1. Rollup tables
+CREATE TABLE IF NOT EXISTS user_checkin_totals (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS user_place_counts (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    location_name TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, location_name)
+);
+
+CREATE TABLE IF NOT EXISTS place_counts (
+    location_name TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+-- Top-N lookups: "ORDER BY count DESC, location_name" with a LIMIT
+CREATE INDEX IF NOT EXISTS idx_user_place_counts_top ON user_place_counts(user_id, count DESC, location_name);
+CREATE INDEX IF NOT EXISTS idx_place_counts_top ON place_counts(count DESC, location_name);
+
+ALTER TABLE user_checkin_totals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_place_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE place_counts ENABLE ROW LEVEL SECURITY;
+
+-- 2. Incremental maintenance
+CREATE OR REPLACE FUNCTION bump_checkin_stats(p_user_id UUID, p_location_name TEXT, p_delta INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO user_checkin_totals AS t (user_id, total)
+    VALUES (p_user_id, GREATEST(p_delta, 0))
+    ON CONFLICT (user_id) DO UPDATE SET total = GREATEST(t.total + p_delta, 0);
+
+    INSERT INTO user_place_counts AS u (user_id, location_name, count)
+    VALUES (p_user_id, p_location_name, GREATEST(p_delta, 0))
+    ON CONFLICT (user_id, location_name) DO UPDATE SET count = GREATEST(u.count + p_delta, 0);
+
+    INSERT INTO place_counts AS p (location_name, count)
+    VALUES (p_location_name, GREATEST(p_delta, 0))
+    ON CONFLICT (location_name) DO UPDATE SET count = GREATEST(p.count + p_delta, 0);
+
+    IF p_delta < 0 THEN
+        DELETE FROM user_place_counts WHERE user_id = p_user_id AND location_name = p_location_name AND count = 0;
+        DELETE FROM place_counts WHERE location_name = p_location_name AND count = 0;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION checkins_stats_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM bump_checkin_stats(OLD.user_id, OLD.location_name, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_checkin_stats(NEW.user_id, NEW.location_name, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_checkins_stats ON checkins;
+CREATE TRIGGER trg_checkins_stats
+AFTER INSERT OR DELETE OR UPDATE OF user_id, location_name ON checkins
+FOR EACH ROW EXECUTE FUNCTION checkins_stats_trigger();
+
+-- 3. Backfill from existing check-ins
+TRUNCATE user_checkin_totals, user_place_counts, place_counts;
+
+INSERT INTO user_checkin_totals (user_id, total)
+SELECT user_id, COUNT(*) FROM checkins GROUP BY user_id;
+
+INSERT INTO user_place_counts (user_id, location_name, count)
+SELECT user_id, location_name, COUNT(*) FROM checkins GROUP BY user_id, location_name;
+
+INSERT INTO place_counts (location_name, count)
+SELECT location_name, COUNT(*) FROM checkins GROUP BY location_name;
@@ -0,0 +1,42 @@
+-- Migration: Stop stats rollups from re-inserting rows for deleted users
+-- Run this in Supabase SQL Editor (after migration_stats_rollups.sql)
+--
+-- bump_checkin_stats upserted for every delta, so a decrement could insert a new
+-- user_checkin_totals / user_place_counts row. Deleting a user cascades to both the rollups and
+-- the user's check-ins, and when the rollup rows went first the check-in delete trigger
+-- re-inserted them for a user_id that no longer exists, failing the delete with an FK violation.
+-- Decrements now only update rows that are still there; only increments upsert.
+
+CREATE OR REPLACE FUNCTION bump_checkin_stats(p_user_id UUID, p_location_name TEXT, p_delta INT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_delta < 0 THEN
+        UPDATE user_checkin_totals SET total = GREATEST(total + p_delta, 0)
+        WHERE user_id = p_user_id;
+
+        UPDATE user_place_counts SET count = GREATEST(count + p_delta, 0)
+        WHERE user_id = p_user_id AND location_name = p_location_name;
+
+        UPDATE place_counts SET count = GREATEST(count + p_delta, 0)
+        WHERE location_name = p_location_name;
+
+        DELETE FROM user_place_counts WHERE user_id = p_user_id AND location_name = p_location_name AND count = 0;
+        DELETE FROM place_counts WHERE location_name = p_location_name AND count = 0;
+        RETURN;
+    END IF;
+
+    INSERT INTO user_checkin_totals AS t (user_id, total)
+    VALUES (p_user_id, p_delta)
+    ON CONFLICT (user_id) DO UPDATE SET total = t.total + p_delta;
+
+    INSERT INTO user_place_counts AS u (user_id, location_name, count)
+    VALUES (p_user_id, p_location_name, p_delta)
+    ON CONFLICT (user_id, location_name) DO UPDATE SET count = u.count + p_delta;
+
+    INSERT INTO place_counts AS p (location_name, count)
+    VALUES (p_location_name, p_delta)
+    ON CONFLICT (location_name) DO UPDATE SET count = p.count + p_delta;
+END;
+$$;
@@ -43,7 +43,7 @@ window.setupPushNotifications = async (userId, apiBaseUrl) => {
         await PushNotifications.addListener('pushNotificationReceived', notification => {
             console.log('Push received: ', notification);
             // Optionally convert to local toast or update UI
-            if (window.loadNotifications) window.loadNotifications();
+            if (window.refreshNotificationBadge) window.refreshNotificationBadge();
         });
 
         await PushNotifications.addListener('pushNotificationActionPerformed', notification => {
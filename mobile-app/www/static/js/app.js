@@ -857,7 +857,7 @@ let searchTimeout = null;
 async function searchLocation(query) {
     const resultsContainer = document.getElementById('searchResults');
 
-    if (!query || query.length < 3) {
+    if (!query || query.length < 2) {
         resultsContainer.style.display = 'none';
         resultsContainer.innerHTML = '';
         return;
@@ -868,47 +868,42 @@ async function searchLocation(query) {
 
     searchTimeout = setTimeout(async () => {
         try {
-            // Connecticut Bounds
-            // viewbox=left,top,right,bottom
-            // Approx: -73.77 (Greenwich), 42.05 (MA border), -71.79 (RI border), 40.98 (Sound)
-            // Using slightly wider box to be safe: -74.0,42.1,-71.5,40.9
+            // Served from the backend's local New Haven place index;
+            // it only falls back to Nominatim (cached server-side) on a miss
             const response = await fetch(
-                `https://nominatim.openstreetmap.org/search?` +
-                `q=${encodeURIComponent(query)}&` +
-                `format=json&` +
-                `addressdetails=1&` +
-                `limit=5&` +
-                `countrycodes=us&` +
-                `viewbox=-73.8,42.1,-71.7,40.9&` +
-                `bounded=1`
+                `${API_BASE_URL}/api/places/search?q=${encodeURIComponent(query)}&limit=5`,
+                { credentials: 'include' }
             );
 
             const data = await response.json();
 
-            if (data.length === 0) {
+            if (!response.ok || data.results.length === 0) {
                 resultsContainer.style.display = 'none';
                 return;
             }
 
-            resultsContainer.innerHTML = data.map(item => {
-                // Construct a friendly name
-                const name = item.name || item.address.amenity || item.address.shop || item.address.building || item.display_name.split(',')[0];
-                const fullAddress = item.display_name;
-
-                return `
-                    <div class="search-result-item" onclick="selectLocation(${item.lat}, ${item.lon}, '${name.replace(/'/g, "\\'")}')">
-                        <div class="result-name">${name}</div>
-                        <div class="result-address">${fullAddress}</div>
+            // Place names come from user check-ins: escape them, and look the result up by
+            // index on click instead of writing the name into an inline handler
+            resultsContainer.innerHTML = data.results.map((item, index) => `
+                    <div class="search-result-item" data-index="${index}">
+                        <div class="result-name">${escapeHtml(item.name)}</div>
+                        <div class="result-address">${escapeHtml(item.address || '')}</div>
                     </div>
-                `;
-            }).join('');
+                `).join('');
+
+            resultsContainer.querySelectorAll('.search-result-item').forEach(el => {
+                el.addEventListener('click', () => {
+                    const item = data.results[Number(el.dataset.index)];
+                    selectLocation(item.lat, item.lng, item.name);
+                });
+            });
 
             resultsContainer.style.display = 'block';
 
         } catch (error) {
             console.error('Search error:', error);
         }
-    }, 500); // 500ms debounce
+    }, 150); // 150ms debounce - local index answers in a few ms
 }
 
 // Select a location from search results
@@ -927,27 +922,27 @@ async function setCurrentLocationAsCheckin() {
     document.getElementById('selectedLat').value = currentLocation.lat;
     document.getElementById('selectedLng').value = currentLocation.lng;
 
-    // Reverse geocode to get location name
+    // Usable straight away; the place name fills in when the lookup returns
+    document.getElementById('locationName').value = 'Current Location';
+    document.getElementById('locationSearch').value = 'Current Location';
+
+    // Reverse geocode to get location name (cached server-side per geohash cell)
     try {
         const response = await fetch(
-            `https://nominatim.openstreetmap.org/reverse?` +
-            `lat=${currentLocation.lat}&` +
-            `lon=${currentLocation.lng}&` +
-            `format=json`
+            `${API_BASE_URL}/api/places/reverse?lat=${currentLocation.lat}&lng=${currentLocation.lng}`,
+            { credentials: 'include' }
         );
 
         const data = await response.json();
-        const locationName = data.address.shop ||
-            data.address.amenity ||
-            data.address.building ||
-            data.address.road ||
-            'Current Location';
-
-        document.getElementById('locationName').value = locationName;
-        document.getElementById('locationSearch').value = locationName;
+        const locationName = (response.ok && data.name) || 'Current Location';
+
+        // Don't overwrite a place the user picked while we were waiting
+        if (document.getElementById('locationName').value === 'Current Location') {
+            document.getElementById('locationName').value = locationName;
+            document.getElementById('locationSearch').value = locationName;
+        }
     } catch (error) {
-        document.getElementById('locationName').value = 'Current Location';
-        document.getElementById('locationSearch').value = 'Current Location';
+        console.error('Reverse geocode error:', error);
     }
 }
 
@@ -1012,25 +1007,91 @@ async function deleteCheckin(checkinId) {
 
 // --- NOTIFICATION SYSTEM ---
 let notificationPollingInterval = null;
-let lastNotificationCount = 0;
+let notificationStream = null;
+let notificationCursor = null;
+let lastNotificationCount = null;
+let currentNotifications = [];
 
 function startNotificationPolling() {
     const btn = document.getElementById('notificationBtn');
     if (btn) btn.style.display = 'flex';
 
-    // Initial load
-    loadNotifications();
+    // Initial badge; the list itself is only fetched when the dropdown opens
+    refreshNotificationBadge();
 
     // Check permission for system notifications
     if ("Notification" in window && Notification.permission !== 'granted' && Notification.permission !== 'denied') {
         Notification.requestPermission();
     }
 
-    // Clear existing interval if any
+    // Prefer the server push stream; poll only while it is unavailable
+    if (!startNotificationStream()) startPollingFallback();
+}
+
+function startPollingFallback() {
+    // Poll the unread count every 30 seconds
+    if (!notificationPollingInterval) notificationPollingInterval = setInterval(refreshNotificationBadge, 30000);
+}
+
+function stopPollingFallback() {
     if (notificationPollingInterval) clearInterval(notificationPollingInterval);
+    notificationPollingInterval = null;
+}
 
-    // Poll every 30 seconds
-    notificationPollingInterval = setInterval(loadNotifications, 30000);
+function startNotificationStream() {
+    if (!window.EventSource) return false;
+    if (notificationStream) notificationStream.close();
+
+    // Resume after the newest notification already shown, so nothing created in between is lost
+    const since = notificationCursor ? `?since=${encodeURIComponent(notificationCursor)}` : '';
+    notificationStream = new EventSource(`${API_BASE_URL}/api/notifications/stream${since}`, { withCredentials: true });
+
+    notificationStream.onopen = () => {
+        stopPollingFallback();
+        // Catch up on anything missed while disconnected
+        refreshNotificationBadge();
+    };
+
+    notificationStream.addEventListener('notification', (event) => {
+        const notification = JSON.parse(event.data);
+        notificationCursor = event.lastEventId;
+        if (currentNotifications.some(n => n.id === notification.id)) return;
+        currentNotifications = [notification, ...currentNotifications].slice(0, 50);
+        if (isNotificationsOpen()) renderNotificationList(currentNotifications);
+        if (!notification.is_read) {
+            setNotificationBadge((lastNotificationCount || 0) + 1);
+            showSystemNotification(notification.title, notification.body);
+        }
+    });
+
+    notificationStream.onerror = () => {
+        // EventSource retries on its own; keep the badge fresh by polling meanwhile.
+        // A closed stream (e.g. 204 when the server has streaming off) stays on polling.
+        startPollingFallback();
+        if (notificationStream.readyState === EventSource.CLOSED) notificationStream = null;
+    };
+
+    return true;
+}
+
+async function refreshNotificationBadge() {
+    if (!userId) return;
+
+    try {
+        const response = await fetch(`${API_BASE_URL}/api/notifications/unread-count`);
+        const data = await response.json();
+
+        if (response.ok) {
+            // Only the count is polled, so a new arrival gets a generic system notification
+            if (lastNotificationCount !== null && data.unread_count > lastNotificationCount) {
+                const count = data.unread_count;
+                showSystemNotification('New notification', `You have ${count} unread notification${count === 1 ? '' : 's'}`);
+            }
+            setNotificationBadge(data.unread_count);
+        }
+    } catch (error) {
+        console.error('Error loading notification count:', error);
+    }
 }
 
 async function loadNotifications() {
@@ -1041,65 +1102,63 @@ async function loadNotifications() {
         const data = await response.json();
 
         if (response.ok) {
-            updateNotificationUI(data.notifications);
+            if (data.latest_cursor) notificationCursor = data.latest_cursor;
+            currentNotifications = data.notifications;
+            renderNotificationList(currentNotifications);
         }
     } catch (error) {
         console.error('Error loading notifications:', error);
     }
 }
 
-function updateNotificationUI(notifications) {
+function setNotificationBadge(unreadCount) {
     const badge = document.getElementById('notificationBadge');
-    const listEl = document.getElementById('notificationsList');
-
-    if (!notifications) return;
-
-    // Count unread
-    const unreadCount = notifications.filter(n => !n.is_read).length;
+    lastNotificationCount = unreadCount;
+    if (!badge) return;
 
-    // Update Badge
     if (unreadCount > 0) {
         badge.textContent = unreadCount;
         badge.classList.remove('badge-hidden');
-
-        // Check if new notifications arrived or just update
-        if (unreadCount > lastNotificationCount) {
-            // Show system notification for the latest unread one
-            const latest = notifications[0];
-            if (latest && !latest.is_read && "Notification" in window && Notification.permission === 'granted') {
-                try {
-                    new Notification(latest.title, {
-                        body: latest.body,
-                        icon: '/static/img/icon.png'
-                    });
-                } catch (e) { }
-            }
-        }
     } else {
         badge.classList.add('badge-hidden');
     }
-    lastNotificationCount = unreadCount;
+}
+
+function showSystemNotification(title, body) {
+    if (!("Notification" in window) || Notification.permission !== 'granted') return;
+    try {
+        new Notification(title, {
+            body: body,
+            icon: '/static/img/icon.png'
+        });
+    } catch (e) { }
+}
+
+function renderNotificationList(notifications) {
+    const listEl = document.getElementById('notificationsList');
+    if (!listEl || !notifications) return;
 
-    // Update List
     if (notifications.length === 0) {
-        if (listEl) listEl.innerHTML = '<div class="empty-notifications">No notifications yet</div>';
+        listEl.innerHTML = '<div class="empty-notifications">No notifications yet</div>';
         return;
     }
 
-    if (listEl) {
-        listEl.innerHTML = notifications.map(n => `
-            <div class="notification-item ${n.is_read ? 'read' : 'unread'}" onclick="handleNotificationClick('${n.id}', '${n.related_id}', '${n.type}')">
-                <div class="notification-title">${escapeHtml(n.title)}</div>
-                <div class="notification-body">${escapeHtml(n.body)}</div>
-                <div class="notification-time">${formatTime(n.created_at)}</div>
-            </div>
-        `).join('');
-    }
+    listEl.innerHTML = notifications.map(n => `
+        <div class="notification-item ${n.is_read ? 'read' : 'unread'}" onclick="handleNotificationClick('${n.id}', '${n.related_id}', '${n.type}')">
+            <div class="notification-title">${escapeHtml(n.title)}</div>
+            <div class="notification-body">${escapeHtml(n.body)}</div>
+            <div class="notification-time">${formatTime(n.created_at)}</div>
+        </div>
+    `).join('');
+}
+
+function isNotificationsOpen() {
+    return document.getElementById('notificationsModal').style.display === 'flex';
 }
 
 function showNotifications() {
     document.getElementById('notificationsModal').style.display = 'flex';
-    // Refetch to be fresh
+    // The list is only fetched while the dropdown is open
     loadNotifications();
 }
 
@@ -1114,6 +1173,7 @@ async function markAllNotificationsRead() {
             body: JSON.stringify({ all: true }),
             headers: { 'Content-Type': 'application/json' }
         });
+        setNotificationBadge(0);
         loadNotifications();
     } catch (e) {
         console.error(e);
@@ -1121,13 +1181,13 @@ async function markAllNotificationsRead() {
 }
 
 async function handleNotificationClick(nid, relatedId, type) {
-    // Mark as read
+    // Mark as read, then refresh the badge
     try {
         fetch(`${API_BASE_URL}/api/notifications/mark-read`, {
             method: 'POST',
             body: JSON.stringify({ notification_id: nid }),
             headers: { 'Content-Type': 'application/json' }
-        });
+        }).then(refreshNotificationBadge, () => { });
     } catch (e) { } // background
 
     // Handle navigation based on type
@@ -1139,9 +1199,6 @@ async function handleNotificationClick(nid, relatedId, type) {
     } else if (type === 'friend_request' || type === 'friend_accept') {
         window.location.href = '/friends';
     }
-
-    // Optimistic update
-    loadNotifications();
 }
 
 function escapeHtml(text) {